@@ -1,8 +1,20 @@
 from abc import ABC, abstractmethod
+from typing import Dict
 
 from redbot.core import Config, commands
 from redbot.core.bot import Red
 
+from .cache import EmbedCache, UserCache
+from .evolutions import EvolutionIndex
+from .ledger import XPLedger
+from .migrations import Migrator
+from .names import NameIndex
+from .pokedex import Pokedex
+from .sampler import AliasSampler
+from .spawns import ChannelSpawns, SpawnCounters, SpawnScheduler
+from .sprites import SpriteCache
+from .storage import Storage
+
 
 class MixinMeta(ABC):
     """Base class for well behaved type hint detection with composite class.
@@ -14,8 +26,21 @@ class MixinMeta(ABC):
         self.bot: Red
         self.datapath: str
         self.spawnedpokemon: dict
-        self.maybe_spawn: dict
+        self.spawncounters: SpawnCounters
+        self.spawnscheduler: SpawnScheduler
+        self.pokedex: Pokedex
         self.guildcache: dict
+        self.usercache: UserCache
+        self.embedcache: EmbedCache
+        self.storage: Storage
+        self.xpledger: XPLedger
+        self.migrator: Migrator
+        self.species: Dict[str, dict]
+        self.name_index: NameIndex
+        self.evolutions: EvolutionIndex
+        self.spawner: AliasSampler
+        self.sprites: SpriteCache
+        self.spawns: ChannelSpawns
 
     @abstractmethod
     async def is_global(self):
@@ -33,6 +58,38 @@ class MixinMeta(ABC):
     def get_name(self):
         raise NotImplementedError
 
+    @abstractmethod
+    async def fetch_slot(self, user_id: int, slot: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def count_pokemon(self, user_id: int) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_selected(self, user):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_selected(self, user, message_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def deselect_pokemon(self, user, message_id: int) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_pokemon(self, user_id: int, message_id: int, pokemon: dict):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def release_pokemon(self, message_id: int) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def transfer_pokemon(self, message_id: int, user_id: int, new_message_id: int) -> bool:
+        raise NotImplementedError
+
     @commands.group(name="poke")
     async def poke(self, ctx: commands.Context):
         """
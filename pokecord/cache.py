@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from redbot.core import Config
+
+
+class EmbedCache:
+    """LRU cache of rendered pokemon embed titles and descriptions.
+
+    Keyed by (message ID, row version, locale, name locale). Every UPDATE of a pokemon bumps
+    its row version and a trade gives it a new message ID, so stale entries are never hit
+    and simply age out.
+    """
+
+    def __init__(self, *, maxsize: int = 2000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Tuple, Tuple[str, str]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Tuple) -> Optional[Tuple[str, str]]:
+        data = self._data.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(key)
+        return data
+
+    def set(self, key: Tuple, data: Tuple[str, str]):
+        self._data[key] = data
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, message_id: int):
+        for key in [key for key in self._data if key[0] == message_id]:
+            del self._data[key]
+
+
+class UserCache:
+    """Read-through LRU cache of user settings.
+
+    Users are loaded from config the first time they are needed and kept until they are
+    invalidated or pushed out by more recently used users. XP cooldowns are only held in
+    memory, so they are kept apart from the settings and survive invalidation.
+    """
+
+    def __init__(self, config: Config, *, maxsize: int = 10000):
+        self.config = config
+        self.maxsize = maxsize
+        self._data: "OrderedDict[int, dict]" = OrderedDict()
+        self._cooldowns: "OrderedDict[int, float]" = OrderedDict()
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, user_id: int) -> Optional[dict]:
+        """Return a cached user without loading them."""
+        data = self._data.get(user_id)
+        if data is not None:
+            self._data.move_to_end(user_id)
+        return data
+
+    async def load(self, user_id: int) -> dict:
+        """Return a user's settings, loading them from config if they aren't cached."""
+        data = self.get(user_id)
+        if data is not None:
+            return data
+        data = await self.config.user_from_id(user_id).all()  # TODO: Support guild
+        self._data[user_id] = data
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        return data
+
+    def invalidate(self, user_id: int):
+        self._data.pop(user_id, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def cooldown(self, user_id: int, now: float, seconds: float) -> bool:
+        """Return whether the user is still on cooldown, starting a new one if they aren't."""
+        last = self._cooldowns.get(user_id)
+        if last is not None and now - last < seconds:
+            return True
+        self._cooldowns[user_id] = now
+        self._cooldowns.move_to_end(user_id)
+        # The oldest cooldown goes first, it has almost always expired by then.
+        if len(self._cooldowns) > self.maxsize:
+            self._cooldowns.popitem(last=False)
+        return False
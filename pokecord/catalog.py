@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import pickle
+from typing import Dict, List
+
+log = logging.getLogger("red.flare.pokecord.catalog")
+
+# Bump when the layout of the compiled catalog changes.
+CATALOG_FORMAT = 1
+CATALOG_FILE = "catalog.pickle"
+# Merged in this order, which is the order pokemon are listed and indexed in.
+CATALOG_SOURCES = (
+    "pokedex",
+    "shiny",
+    "legendary",
+    "mythical",
+    "galarian",
+    "hisuian",
+    "paldea",
+    "alolan",
+    "megas",
+)
+EXTRA_SOURCES = ("evolve", "genders", "url")
+
+
+def species_key(pokemon: dict) -> str:
+    """The name that identifies a catalog entry, shared with its sprite file."""
+    if not pokemon.get("variant"):
+        return pokemon["name"]["english"]
+    return pokemon.get("alias") or pokemon["name"]["english"]
+
+
+class CatalogError(Exception):
+    pass
+
+
+def _source_paths(path: str) -> List[str]:
+    return [f"{path}/{name}.json" for name in CATALOG_SOURCES + EXTRA_SOURCES]
+
+
+def source_hash(path: str) -> str:
+    """Hash of every source file that goes into the catalog."""
+    digest = hashlib.sha256(str(CATALOG_FORMAT).encode())
+    for source in _source_paths(path):
+        with open(source, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def validate(pokemons: List[dict]) -> List[str]:
+    """Return every problem found in the merged catalog."""
+    errors = []
+    seen = set()
+    for pokemon in pokemons:
+        for field in ("id", "name", "stats", "type", "spawnchance"):
+            if field not in pokemon:
+                errors.append(f"{pokemon.get('name')} is missing {field}.")
+        if "name" not in pokemon or "english" not in pokemon["name"]:
+            continue
+        key = species_key(pokemon)
+        if key in seen:
+            errors.append(f"{key} is in the catalog twice.")
+        seen.add(key)
+        if pokemon.get("spawnchance", 0) < 0:
+            errors.append(f"{key} has a negative spawnchance.")
+    return errors
+
+
+def build(path: str) -> Dict:
+    """Merge, patch and validate the JSON sources into a catalog."""
+    pokemons = []
+    for name in CATALOG_SOURCES:
+        with open(f"{path}/{name}.json", encoding="utf-8") as f:
+            pokemons += json.load(f)
+    with open(f"{path}/evolve.json", encoding="utf-8") as f:
+        evolve = json.load(f)
+    with open(f"{path}/genders.json", encoding="utf-8") as f:
+        genders = json.load(f)
+    with open(f"{path}/url.json", encoding="utf-8") as f:
+        url = json.load(f)
+    errors = validate(pokemons)
+    for pokemon in pokemons:
+        key = species_key(pokemon)
+        if "shiny" in key.lower():
+            continue
+        link = url.get(key)
+        if link is None:
+            errors.append(f"{key} has no url.")
+            continue
+        if isinstance(link, list):
+            link = link[0]
+        pokemon["url"] = link
+    if errors:
+        raise CatalogError("\n".join(errors))
+    return {
+        "format": CATALOG_FORMAT,
+        "version": source_hash(path),
+        "pokemon": pokemons,
+        "evolve": evolve,
+        "genders": genders,
+    }
+
+
+def write(catalog: Dict, path: str):
+    with open(f"{path}/{CATALOG_FILE}", "wb") as f:
+        pickle.dump(catalog, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load(path: str) -> Dict:
+    """Load the compiled catalog, building it from the JSON sources if it is missing or stale."""
+    try:
+        with open(f"{path}/{CATALOG_FILE}", "rb") as f:
+            catalog = pickle.load(f)
+    except FileNotFoundError:
+        catalog = None
+    if catalog is None or catalog.get("format") != CATALOG_FORMAT:
+        log.warning("Compiled catalog is missing or outdated, building it from the JSON data.")
+        return build(path)
+    if catalog.get("version") != source_hash(path):
+        log.warning(
+            "Compiled catalog doesn't match the JSON data, building it from the JSON data. "
+            "Run `make catalog` to update it."
+        )
+        return build(path)
+    return catalog
@@ -0,0 +1,168 @@
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from databases import Database
+from databases.core import Connection
+
+log = logging.getLogger("red.flare.pokecord.connections")
+
+# A unit of writes, run on the writer's connection inside the group's transaction.
+Unit = Callable[[Database], Awaitable[Any]]
+
+
+class WriteQueue:
+    """The only writer to pokemon.db, committing queued writes in groups.
+
+    Writes are queued as units and one task runs them back to back in a single transaction,
+    committing once the group holds `max_group` units or has waited `max_delay` seconds for
+    more. Each unit runs in its own savepoint, so a failing unit is rolled back alone and
+    only its caller sees the error. Callers are resolved once their group has committed.
+    """
+
+    def __init__(self, database: Database, *, max_group: int = 256, max_delay: float = 0.005):
+        self.database = database
+        self.max_group = max_group
+        self.max_delay = max_delay
+        self.groups = 0
+        self.units = 0
+        self.largest = 0
+        self._queue: "asyncio.Queue[Optional[Tuple[Unit, asyncio.Future]]]" = asyncio.Queue()
+        self._closed = False
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def submit(self, unit: Unit) -> Any:
+        """Queue a unit of writes and wait for it to be committed, returning its result."""
+        if self._closed:
+            raise RuntimeError("The write queue is closed.")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((unit, future))
+        return await future
+
+    async def execute(self, query: str, values: Optional[dict] = None):
+        return await self.submit(lambda db: db.execute(query=query, values=values))
+
+    async def execute_many(self, query: str, values: List[dict]):
+        return await self.submit(lambda db: db.execute_many(query=query, values=values))
+
+    async def _collect(self) -> Tuple[List[Tuple[Unit, asyncio.Future]], bool]:
+        """Wait for the next group, returning it and whether the queue was closed."""
+        item = await self._queue.get()
+        if item is None:
+            return [], True
+        group = [item]
+        deadline = time.monotonic() + self.max_delay
+        while len(group) < self.max_group:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                return group, True
+            group.append(item)
+        return group, False
+
+    async def _commit(self, group: List[Tuple[Unit, asyncio.Future]]):
+        results = []
+        try:
+            async with self.database.transaction():
+                for unit, future in group:
+                    try:
+                        async with self.database.transaction():
+                            results.append((future, await unit(self.database), None))
+                    except Exception as exc:
+                        results.append((future, None, exc))
+        except Exception as exc:
+            # The commit itself failed, so none of the group was written.
+            results = [(future, None, exc) for _, future in group]
+        self.groups += 1
+        self.units += len(group)
+        self.largest = max(self.largest, len(group))
+        for future, result, exc in results:
+            if future.done():
+                continue  # The caller was cancelled, the write still happened.
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+    async def run(self):
+        while True:
+            group, closed = await self._collect()
+            if group:
+                await self._commit(group)
+            if closed:
+                return
+
+    async def close(self):
+        """Stop accepting writes, letting `run` commit what is already queued and return."""
+        self._closed = True
+        self._queue.put_nowait(None)
+
+
+class ReadPool:
+    """A few long-lived read connections to pokemon.db.
+
+    The database is in WAL mode, so readers neither block the writer nor each other. Lists
+    and searches run alongside commits instead of queueing behind them.
+    """
+
+    def __init__(self, url: str, *, size: int = 3):
+        self.url = url
+        self.size = size
+        self._databases: List[Database] = []
+        self._free: "asyncio.Queue[Connection]" = asyncio.Queue()
+        self._stack = contextlib.AsyncExitStack()
+
+    @property
+    def busy(self) -> int:
+        return len(self._databases) - self._free.qsize()
+
+    async def connect(self):
+        for _ in range(self.size):
+            database = Database(self.url)
+            await database.connect()
+            self._databases.append(database)
+            self._free.put_nowait(await self._stack.enter_async_context(database.connection()))
+
+    async def disconnect(self):
+        await self._stack.aclose()
+        for database in self._databases:
+            await database.disconnect()
+        self._databases = []
+
+    @contextlib.asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Connection]:
+        connection = await self._free.get()
+        try:
+            yield connection
+        finally:
+            self._free.put_nowait(connection)
+
+    async def fetch_all(self, query: str, values: Optional[dict] = None):
+        async with self.acquire() as connection:
+            return await connection.fetch_all(query=query, values=values)
+
+    async def fetch_one(self, query: str, values: Optional[dict] = None):
+        async with self.acquire() as connection:
+            return await connection.fetch_one(query=query, values=values)
+
+    async def fetch_val(self, query: str, values: Optional[dict] = None):
+        async with self.acquire() as connection:
+            return await connection.fetch_val(query=query, values=values)
+
+    async def iterate(self, query: str, values: Optional[dict] = None):
+        async with self.acquire() as connection:
+            async for row in connection.iterate(query=query, values=values):
+                yield row
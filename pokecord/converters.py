@@ -2,6 +2,9 @@ import argparse
 
 from redbot.core.commands import BadArgument, Converter
 
+from .search import parse_range
+from .statements import SEARCH_SORTS
+
 
 class NoExitParser(argparse.ArgumentParser):
     def error(self, message):
@@ -13,17 +16,19 @@ class Args(Converter):
         argument = argument.replace("—", "--")
         parser = NoExitParser(description="Pokecord Search", add_help=False)
 
-        pokemon = parser.add_mutually_exclusive_group()
-        pokemon.add_argument("--name", "--n", nargs="*", dest="names", default=[])
-        pokemon.add_argument("--level", "--l", nargs="*", dest="level", type=int, default=0)
-        pokemon.add_argument("--id", "--i", nargs="*", dest="id", type=int, default=0)
-        pokemon.add_argument("--variant", "--v", nargs="*", dest="variant", default=[])
-        pokemon.add_argument("--gender", "--g", nargs="*", dest="gender", default=[])
-        pokemon.add_argument("--iv", nargs="*", dest="iv", type=int, default=0)
-        pokemon.add_argument("--type", "--t", nargs="*", dest="type", default=[])
+        parser.add_argument("--name", "--n", nargs="*", dest="names", default=[])
+        parser.add_argument("--level", "--l", nargs="*", dest="level", default=[])
+        parser.add_argument("--id", "--i", nargs="*", dest="id", default=[])
+        parser.add_argument("--variant", "--v", nargs="*", dest="variant", default=[])
+        parser.add_argument("--gender", "--g", nargs="*", dest="gender", default=[])
+        parser.add_argument("--iv", nargs="*", dest="iv", default=[])
+        parser.add_argument("--type", "--t", nargs="*", dest="type", default=[])
+        parser.add_argument("--sort", "--s", dest="sort", default="slot", choices=SEARCH_SORTS)
+        parser.add_argument("--desc", dest="desc", action="store_true")
+        parser.add_argument("--limit", dest="limit", type=int, default=None)
 
         try:
-            vals = vars(parser.parse_args(argument.split(" ")))
+            vals = vars(parser.parse_args(argument.split()))
         except Exception as error:
             raise BadArgument() from error
 
@@ -36,14 +41,27 @@ class Args(Converter):
                 vals["gender"],
                 vals["iv"],
                 vals["type"],
+                vals["sort"] != "slot",
+                vals["limit"],
             ]
         ):
             raise BadArgument(
-                "You must provide one of `--name`, `--level`, `--id`, `--variant`, `--iv`, `--gender` or `--type``"
+                "You must provide one of `--name`, `--level`, `--id`, `--variant`, `--iv`, `--gender`, `--type` or `--sort``"
             )
+        if vals["limit"] is not None and vals["limit"] <= 0:
+            raise BadArgument("The limit must be greater than 0.")
 
         vals["names"] = " ".join(vals["names"])
         vals["variant"] = " ".join(vals["variant"])
         vals["gender"] = " ".join(vals["gender"])
         vals["type"] = " ".join(vals["type"])
+        for key in ("level", "id", "iv"):
+            if not vals[key]:
+                continue
+            bounds = parse_range(" ".join(vals[key]))
+            if bounds is None:
+                raise BadArgument(
+                    f"`--{key}` must be a number or a range like `30..50`, `>150` or `<=20`."
+                )
+            vals[key] = bounds
         return vals
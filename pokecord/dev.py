@@ -1,5 +1,8 @@
-import json
+import asyncio
 import pprint
+import random
+import time
+from types import SimpleNamespace
 from typing import Optional
 
 import discord
@@ -9,13 +12,52 @@ from redbot.core.i18n import Translator
 from redbot.core.utils.chat_formatting import *
 
 from .abc import MixinMeta
+from .catalog import species_key
+from .spawns import ChannelSpawns
 from .statements import *
+from .storage import MemoryStorage
 
 poke = MixinMeta.poke
 
 _ = Translator("Pokecord", __file__)
 
 
+class ScratchCatch:
+    """The cog as `catch` sees it in `[p]poke dev claimtest`.
+
+    Spawns and storage are scratch copies and every catcher has a starter, so no real channel,
+    user or pokemon is touched. Anything else is looked up on the cog.
+    """
+
+    def __init__(self, cog):
+        self.cog = cog
+        self.spawns = ChannelSpawns(cog.config)  # Never flushed, so config isn't touched.
+        self.storage = MemoryStorage()
+
+    def __getattr__(self, name):
+        return getattr(self.cog, name)
+
+    async def user_is_global(self, user):
+        return self
+
+    async def has_starter(self):
+        await asyncio.sleep(random.random() / 1000)  # Interleave like real catches.
+        return True
+
+
+class ScratchContext:
+    """Just enough of a context for `catch` to run, replies are dropped."""
+
+    def __init__(self, user_id: int):
+        self.author = SimpleNamespace(id=user_id, mention=f"<@{user_id}>")
+        self.channel = SimpleNamespace(id=0)
+        self.message = SimpleNamespace(id=user_id)
+        self.clean_prefix = ""
+
+    async def send(self, *args, **kwargs):
+        pass
+
+
 class Dev(MixinMeta):
     """Pokecord Development Commands"""
 
@@ -28,35 +70,176 @@ class Dev(MixinMeta):
     async def dev_spawn(self, ctx, *pokemon):
         """Spawn a pokemon by name or random"""
         pokemon = " ".join(pokemon).strip().lower()
-        if pokemon is "":
+        if pokemon == "":
             await self.spawn_pokemon(ctx.channel)
             return
-        else:
-            for i, pokemondata in enumerate(self.pokemondata):
-                name = (
-                    pokemondata.get("alias").lower()
-                    if pokemondata.get("alias")
-                    else pokemondata["name"]["english"].lower()
-                )
-                if name == pokemon:
-                    await self.spawn_pokemon(ctx.channel, pokemon=self.pokemondata[i])
-                    return
+        keys = self.name_index.find(pokemon)
+        if keys:
+            await self.spawn_pokemon(ctx.channel, pokemon=self.species[keys[0]])
+            return
         await ctx.send("No pokemon found.")
 
+    @dev.command(name="chain")
+    async def dev_chain(self, ctx, *, pokemon: str):
+        """Show the evolution chain of a pokemon"""
+        keys = self.name_index.find(pokemon)
+        if not keys:
+            return await ctx.send("No pokemon found.")
+        lst = [
+            [key, level if level is not None else "-"]
+            for key, level in self.evolutions.chain(keys[0])
+        ]
+        await ctx.send(box(tabulate.tabulate(lst, headers=["Pokemon", "Level"])))
+
     async def get_pokemon(self, ctx, user: discord.Member, pokeid: int) -> list:
         """Returns pokemons from user list if exists"""
         if pokeid <= 0:
             return await ctx.send("The ID must be greater than 0!")
         async with ctx.typing():
-            result = await self.cursor.fetch_all(query=SELECT_POKEMON, values={"user_id": user.id})
-        pokemons = [None]
-        for data in result:
-            pokemons.append([json.loads(data[0]), data[1]])
-        if not pokemons:
-            return await ctx.send("You don't have any pokémon, trainer!")
-        if pokeid >= len(pokemons):
+            await self.xpledger.evict(user.id)
+            data = await self.fetch_slot(user.id, pokeid)
+        if data is None:
             return await ctx.send("There's no pokemon at that slot.")
-        return pokemons[pokeid]
+        return [data.pokemon, data.message_id]
+
+    @dev.command(name="xpstats")
+    async def dev_xpstats(self, ctx):
+        """Show how many XP writes the ledger has saved"""
+        ledger = self.xpledger
+        await ctx.send(
+            box(
+                f"Gains: {ledger.gains}\n"
+                f"Writes: {ledger.writes}\n"
+                f"Coalesced: {ledger.coalesced}\n"
+                f"Pending: {ledger.pending}\n"
+                f"Tracked users: {len(ledger)}",
+                lang="yaml",
+            )
+        )
+
+    @dev.command(name="sprites")
+    async def dev_sprites(self, ctx):
+        """Show sprite cache usage"""
+        sprites = self.sprites
+        total = sprites.hits + sprites.misses
+        await ctx.send(
+            box(
+                f"Set: {sprites.spriteset}\n"
+                f"Hits: {sprites.hits}\n"
+                f"Misses: {sprites.misses}\n"
+                f"Hit rate: {sprites.hits / total if total else 0:.1%}\n"
+                f"Sprites: {len(sprites)}\n"
+                f"Size: {sprites.size / 1024 / 1024:.1f}/{sprites.maxsize / 1024 / 1024:.0f}MB\n"
+                + (
+                    f"Pack: {len(sprites.pack)} sprites, {sprites.pack.size / 1024 / 1024:.1f}MB\n"
+                    f"Served from pack: {sprites.packed}"
+                    if sprites.pack is not None
+                    else "Pack: None"
+                ),
+                lang="yaml",
+            )
+        )
+
+    @dev.command(name="counters")
+    async def dev_counters(self, ctx):
+        """Show the size of the spawn counters"""
+        counters = self.spawncounters
+        await ctx.send(
+            box(
+                f"Guilds: {len(counters)}\n"
+                f"Expired: {counters.expired}\n"
+                f"Memory: {counters.memory() / 1024:.1f}KB",
+                lang="yaml",
+            )
+        )
+
+    @dev.command(name="scheduler")
+    async def dev_scheduler(self, ctx):
+        """Show the random spawn scheduler's queue"""
+        scheduler = self.spawnscheduler
+        lateness = list(scheduler.lateness)
+        next_due = scheduler.next_due()
+        await ctx.send(
+            box(
+                f"Interval: {scheduler.interval}s\n"
+                f"Pending: {scheduler.pending}\n"
+                f"In flight: {scheduler.in_flight}\n"
+                f"Next due: {f'{next_due:.0f}s' if next_due is not None else 'None'}\n"
+                f"Sent: {scheduler.sent}\n"
+                f"Skipped: {scheduler.skipped}\n"
+                f"Average lateness: {sum(lateness) / len(lateness) if lateness else 0:.2f}s\n"
+                f"Max lateness: {max(lateness, default=0):.2f}s",
+                lang="yaml",
+            )
+        )
+
+    @dev.command(name="storage")
+    async def dev_storage(self, ctx):
+        """Show the storage backend in use and its stats"""
+        stats = self.storage.stats()
+        await ctx.send(
+            box(
+                f"Backend: {self.storage.name}\n"
+                + "".join(f"{key}: {value}\n" for key, value in stats.items()),
+                lang="yaml",
+            )
+        )
+
+    @dev.command(name="migrations")
+    async def dev_migrations(self, ctx, dry_run: bool = False):
+        """Show the migration progress, or check what pending migrations would touch"""
+        migrator = self.migrator
+        pending = await migrator.pending()
+        msg = f"Version: {await self.config.migration()}\n"
+        msg += f"Pending: {humanize_list([str(step.version) for step in pending]) or 'None'}\n"
+        if migrator.current is not None:
+            msg += (
+                f"Running: {migrator.current.version} ({migrator.current.description})\n"
+                f"Progress: {migrator.migrated}/{migrator.total}\n"
+            )
+        if migrator.error is not None:
+            msg += f"Failures: {migrator.failures}\nLast error: {migrator.error!r}\n"
+            if migrator.retry_at is not None and migrator.current is None:
+                msg += f"Retrying in: {max(migrator.retry_at - time.monotonic(), 0):.0f}s\n"
+        for step in pending:
+            checkpoint, migrated = await migrator.checkpoint(step)
+            if checkpoint:
+                msg += f"Checkpoint {step.version}: {checkpoint} ({migrated} migrated)\n"
+        if dry_run and pending and migrator.current is None:
+            async with ctx.typing():
+                counts = await migrator.run(dry_run=True)
+            for version, count in counts.items():
+                msg += f"Would migrate {version}: {count}\n"
+        await ctx.send(box(msg, lang="yaml"))
+
+    @dev.command(name="claimtest")
+    async def dev_claimtest(self, ctx, attempts: int = 50, rounds: int = 20):
+        """Race concurrent catches for one spawn and check only one is stored"""
+        failures = 0
+        async with ctx.typing():
+            for _ in range(rounds):
+                cog = ScratchCatch(self)
+                key = species_key(self.pokemon_choose())
+                cog.spawns.set(0, key)
+                name = self.species[key]["name"]["english"]
+                users = range(1, attempts + 1)
+                await asyncio.gather(
+                    *(
+                        self.catch.callback(cog, ScratchContext(user), pokemon=name)
+                        for user in users
+                    )
+                )
+                caught = sum([sum((await cog.storage.pokedex(user)).values()) for user in users])
+                if cog.storage.stats()["Pokemon"] != 1 or caught != 1 or 0 in cog.spawns:
+                    failures += 1
+        await ctx.send(
+            box(
+                f"Rounds: {rounds}\n"
+                f"Catches per round: {attempts}\n"
+                f"Rounds without exactly one catch stored: {failures}",
+                lang="yaml",
+            )
+        )
 
     @dev.command(name="ivs")
     async def dev_ivs(
@@ -85,14 +268,7 @@ class Dev(MixinMeta):
             "Sp. Def": spdef,
             "Speed": speed,
         }
-        await self.cursor.execute(
-            query=UPDATE_POKEMON,
-            values={
-                "user_id": user.id,
-                "message_id": pokemon[1],
-                "pokemon": json.dumps(pokemon[0]),
-            },
-        )
+        await self.update_pokemon(user.id, pokemon[1], pokemon[0])
         await ctx.tick()
 
     @dev.command(name="stats")
@@ -122,14 +298,7 @@ class Dev(MixinMeta):
             "Sp. Def": spdef,
             "Speed": speed,
         }
-        await self.cursor.execute(
-            query=UPDATE_POKEMON,
-            values={
-                "user_id": user.id,
-                "message_id": pokemon[1],
-                "pokemon": json.dumps(pokemon[0]),
-            },
-        )
+        await self.update_pokemon(user.id, pokemon[1], pokemon[0])
         await ctx.tick()
 
     @dev.command(name="level")
@@ -141,14 +310,7 @@ class Dev(MixinMeta):
         if not isinstance(pokemon, list):
             return
         pokemon[0]["level"] = lvl
-        await self.cursor.execute(
-            query=UPDATE_POKEMON,
-            values={
-                "user_id": user.id,
-                "message_id": pokemon[1],
-                "pokemon": json.dumps(pokemon[0]),
-            },
-        )
+        await self.update_pokemon(user.id, pokemon[1], pokemon[0])
         await ctx.tick()
 
     @dev.command(name="reveal")
@@ -167,37 +329,24 @@ class Dev(MixinMeta):
         if id <= 0:
             return await ctx.send("The ID must be greater than 0!")
         async with ctx.typing():
-            result = await self.cursor.fetch_all(query=SELECT_POKEMON, values={"user_id": user.id})
-        pokemons = [None]
-        for data in result:
-            pokemons.append([json.loads(data[0]), data[1]])
-        if not pokemons:
-            return await ctx.send(f"{user.display_name} don't have any pokémon!")
-        if id >= len(pokemons):
+            await self.xpledger.evict(user.id)
+            data = await self.fetch_slot(user.id, id)
+        if data is None:
             return await ctx.send("There's no pokemon at that slot.")
-        pokemon = pokemons[id]
+        pokemon = [data.pokemon, data.message_id]
         msg = ""
-        userconf = await self.user_is_global(user)
-        pokeid = await userconf.pokeid()
-        if id < pokeid:
-            msg += _(
-                "\nTheir default pokemon may have changed. I have tried to account for this change."
-            )
-            await userconf.pokeid.set(pokeid - 1)
-        elif id == pokeid:
+        if await self.deselect_pokemon(user, pokemon[1]):
             msg += _(
                 "\nYou have released their selected pokemon. I have reset their selected pokemon to their first pokemon."
             )
-            await userconf.pokeid.set(1)
-        if len(pokemons) == 2:  # it was their last pokemon, resets starter
+        if await self.count_pokemon(user.id) == 1:  # it was their last pokemon, resets starter
+            userconf = await self.user_is_global(user)
             await userconf.has_starter.set(False)
             msg = _(
                 f"\n{user.display_name} has no pokemon left. I have granted them another chance to pick a starter."
             )
-        await self.cursor.execute(
-            query="DELETE FROM users where message_id = :message_id",
-            values={"message_id": pokemon[1]},
-        )
+        await self.release_pokemon(pokemon[1])
+        self.usercache.invalidate(user.id)
         name = self.get_name(pokemon[0]["name"], user)
         await ctx.send(
             _(f"{user.display_name}'s {name} has been freed.{msg}").format(name=name, msg=msg)
@@ -0,0 +1,108 @@
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .catalog import species_key
+
+log = logging.getLogger("red.flare.pokecord.evolutions")
+
+Stage = Tuple[str, Optional[int]]
+
+
+def _variant(pokemon: dict) -> Optional[str]:
+    return pokemon.get("variant") or None
+
+
+def _english(pokemon: dict) -> str:
+    if isinstance(pokemon["name"], str):
+        return pokemon["name"]
+    return pokemon["name"]["english"]
+
+
+class EvolutionIndex:
+    """Evolutions from `evolve.json` resolved against the catalog once at load.
+
+    Each (English name, variant) pair maps to the level it evolves at and the catalog entry it
+    evolves into, keeping the variant of the pokemon that evolves. Full evolution chains are
+    kept per species key.
+    """
+
+    def __init__(self, evolvedata: Dict[str, dict], pokemons: Iterable[dict]):
+        pokemons = list(pokemons)
+        self.species: Dict[str, dict] = {}
+        candidates: Dict[str, List[dict]] = {}
+        for pokemon in pokemons:
+            key = species_key(pokemon)
+            self.species.setdefault(key, pokemon)
+            candidates.setdefault(_english(pokemon), []).append(pokemon)
+            if key != _english(pokemon):
+                candidates.setdefault(key, []).append(pokemon)
+
+        self._evolutions: Dict[Tuple[str, Optional[str]], Tuple[int, str]] = {}
+        self._next: Dict[str, Tuple[int, str]] = {}
+        unresolved = []
+        for pokemon in pokemons:
+            key = species_key(pokemon)
+            lookup = (_english(pokemon), _variant(pokemon))
+            if key in self._next or lookup in self._evolutions:
+                continue
+            evolve = evolvedata.get(key) or evolvedata.get(lookup[0])
+            if evolve is None:
+                continue
+            target = self._resolve(candidates.get(evolve["evolution"], []), lookup[1])
+            if target is None:
+                unresolved.append(f"{key} -> {evolve['evolution']}")
+                continue
+            evolution = (int(evolve["level"]), species_key(target))
+            self._next[key] = evolution
+            self._evolutions[lookup] = evolution
+        if unresolved:
+            log.warning(
+                f"{len(unresolved)} evolutions could not be resolved and will be skipped: "
+                + ", ".join(unresolved)
+            )
+
+        self.chains: Dict[str, Tuple[Stage, ...]] = {}
+        targets = {target for _, target in self._next.values()}
+        for key in self._next:
+            if key not in targets:
+                self._build_chain(key)
+        for key in self._next:
+            if key not in self.chains:  # Only reachable through a cycle
+                self._build_chain(key)
+
+    @staticmethod
+    def _resolve(candidates: List[dict], variant: Optional[str]) -> Optional[dict]:
+        for pokemon in candidates:
+            if _variant(pokemon) == variant:
+                return pokemon
+        if variant is None and candidates:
+            return candidates[0]
+        return None
+
+    def _build_chain(self, key: str):
+        chain: List[Stage] = [(key, None)]
+        seen = {key}
+        while key in self._next:
+            level, key = self._next[key]
+            if key in seen:
+                break
+            seen.add(key)
+            chain.append((key, level))
+        chain = tuple(chain)
+        for stage, _ in chain:
+            self.chains.setdefault(stage, chain)
+
+    def __len__(self):
+        return len(self._evolutions)
+
+    def get(self, pokemon: dict) -> Optional[Tuple[int, dict]]:
+        """The level a pokemon evolves at and the catalog entry it evolves into."""
+        evolution = self._evolutions.get((_english(pokemon), _variant(pokemon)))
+        if evolution is None:
+            return None
+        level, key = evolution
+        return level, self.species[key]
+
+    def chain(self, key: str) -> Tuple[Stage, ...]:
+        """Every stage of a species' evolution chain with the level each one is reached at."""
+        return self.chains.get(key, ((key, None),))
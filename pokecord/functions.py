@@ -1,6 +1,8 @@
+import json
+from typing import List, Tuple
+
 import discord
-import tabulate
-from redbot.core.i18n import Translator
+from redbot.core.i18n import Translator, get_locale
 from redbot.core.utils.chat_formatting import box
 
 _ = Translator("Pokecord", __file__)
@@ -12,20 +14,62 @@ def chunks(l, n):
         yield l[i : i + n]
 
 
-async def poke_embed(cog, ctx, pokemon, *, file=False, menu=None):
-    stats = pokemon["stats"]
-    ivs = pokemon["ivs"]
-    pokestats = tabulate.tabulate(
-        [
-            [_("HP"), stats["HP"], ivs["HP"]],
-            [_("Attack"), stats["Attack"], ivs["Attack"]],
-            [_("Defence"), stats["Defence"], ivs["Defence"]],
-            [_("Sp. Atk"), stats["Sp. Atk"], ivs["Sp. Atk"]],
-            [_("Sp. Def"), stats["Sp. Def"], ivs["Sp. Def"]],
-            [_("Speed"), stats["Speed"], ivs["Speed"]],
-        ],
-        headers=[_("Stats"), _("Value"), _("IV")],
-    )
+def pokemon_row(user_id: int, message_id: int, pokemon: dict) -> dict:
+    """Values for INSERT_POKEMON and UPDATE_POKEMON, mirroring the JSON into typed columns."""
+    gender = pokemon.get("gender")
+    ivs = pokemon.get("ivs")
+    return {
+        "user_id": user_id,
+        "message_id": message_id,
+        "pokemon": json.dumps(pokemon),
+        "species_id": pokemon.get("id", 0),
+        "variant": pokemon.get("variant"),
+        "level": pokemon.get("level", 1),
+        "xp": pokemon.get("xp", 0),
+        "gender": gender.split()[0].lower() if gender else None,
+        "iv_total": sum(ivs.values()) if ivs else 0,
+        "nickname": pokemon.get("nickname"),
+    }
+
+
+STAT_NAMES = ("HP", "Attack", "Defence", "Sp. Atk", "Sp. Def", "Speed")
+_stat_labels = {}
+
+
+def stat_labels(locale: str) -> Tuple[Tuple[str, str, str], List[str]]:
+    """Translated stat table headers and left-justified stat names, built once per locale."""
+    labels = _stat_labels.get(locale)
+    if labels is None:
+        headers = (_("Stats"), _("Value"), _("IV"))
+        # Literal calls so redgettext extracts them, in STAT_NAMES order.
+        names = (_("HP"), _("Attack"), _("Defence"), _("Sp. Atk"), _("Sp. Def"), _("Speed"))
+        # Like tabulate, columns are at least two wider than their header.
+        width = max(len(headers[0]) + 2, *(len(name) for name in names))
+        labels = (headers[0].ljust(width), headers[1], headers[2]), [
+            name.ljust(width) for name in names
+        ]
+        _stat_labels[locale] = labels
+    return labels
+
+
+def stats_table(locale: str, stats: dict, ivs: dict) -> str:
+    """Fixed-width stats table laid out like tabulate's simple format."""
+    headers, names = stat_labels(locale)
+    values = [str(stats[stat]) for stat in STAT_NAMES]
+    iv_values = [str(ivs[stat]) for stat in STAT_NAMES]
+    value_width = max(len(headers[1]) + 2, *(len(value) for value in values))
+    iv_width = max(len(headers[2]) + 2, *(len(value) for value in iv_values))
+    lines = [
+        f"{headers[0]}  {headers[1].rjust(value_width)}  {headers[2].rjust(iv_width)}",
+        f"{'-' * len(names[0])}  {'-' * value_width}  {'-' * iv_width}",
+    ]
+    for name, value, iv in zip(names, values, iv_values):
+        lines.append(f"{name}  {value.rjust(value_width)}  {iv.rjust(iv_width)}")
+    return "\n".join(lines)
+
+
+def render_embed(cog, ctx, pokemon, locale: str) -> Tuple[str, str]:
+    """Title and description of a pokemon's embed."""
     nick = pokemon.get("nickname")
     alias = _("**Nickname**: {nick}\n").format(nick=nick) if nick is not None else ""
     variant = (
@@ -45,23 +89,36 @@ async def poke_embed(cog, ctx, pokemon, *, file=False, menu=None):
         variant=variant,
         xp=pokemon["xp"],
         totalxp=cog.calc_xp(pokemon["level"]),
-        stats=box(pokestats, lang="prolog"),
+        stats=box(stats_table(locale, pokemon["stats"], pokemon["ivs"]), lang="prolog"),
     )
-    embed = discord.Embed(
-        title=cog.get_name(pokemon["name"], ctx.author)
+    title = (
+        cog.get_name(pokemon["name"], ctx.author)
         if not pokemon.get("alias", False)
-        else pokemon.get("alias"),
-        description=desc,
+        else pokemon.get("alias")
     )
+    return title, desc
+
+
+async def poke_embed(cog, ctx, pokemon, *, file=False, menu=None, key=None):
+    """Build a pokemon's embed.
+
+    Pass the row's (message ID, version) as `key` to reuse the rendered title and
+    description from the embed cache."""
+    locale = get_locale()
+    if key is not None:
+        userconf = cog.usercache.get(ctx.author.id)
+        key = (*key, locale, userconf["locale"] if userconf is not None else "en")
+        rendered = cog.embedcache.get(key)
+    else:
+        rendered = None
+    if rendered is None:
+        rendered = render_embed(cog, ctx, pokemon, locale)
+        if key is not None:
+            cog.embedcache.set(key, rendered)
+    embed = discord.Embed(title=rendered[0], description=rendered[1])
     embed.set_footer(text=_("Pokémon ID: {number}").format(number=pokemon["sid"]))
     if file:
-        _file = discord.File(
-            cog.datapath
-            + f'/pokemon/{pokemon["name"]["english"] if not pokemon.get("variant") else pokemon.get("alias") if pokemon.get("alias") else pokemon["name"]["english"]}.png'.replace(
-                ":", ""
-            ),
-            filename="pokemonspawn.png",
-        )
+        _file = await cog.sprites.file(pokemon)
         embed.set_thumbnail(url="attachment://pokemonspawn.png")
         return embed, _file
     else:
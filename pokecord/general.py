@@ -1,10 +1,7 @@
 import asyncio
-import copy
-import json
 from typing import Union
 
 import discord
-import tabulate
 from redbot.core import commands
 from redbot.core.i18n import Translator
 from redbot.core.utils.chat_formatting import *
@@ -12,9 +9,8 @@ from redbot.core.utils.predicates import MessagePredicate
 
 from .abc import MixinMeta
 from .converters import Args
-from .functions import chunks, poke_embed
+from .functions import poke_embed
 from .menus import GenericMenu, PokedexFormat, PokeList, PokeListMenu, SearchFormat
-from .statements import *
 
 poke = MixinMeta.poke
 
@@ -37,21 +33,17 @@ class GeneralMixin(MixinMeta):
             )
         user = user or ctx.author
         async with ctx.typing():
-            result = await self.cursor.fetch_all(query=SELECT_POKEMON, values={"user_id": user.id})
-        pokemons = []
-        for i, data in enumerate(result, start=1):
-            poke = json.loads(data[0])
-            poke["sid"] = i
-            pokemons.append(poke)
-        if not pokemons:
+            count = await self.count_pokemon(user.id)
+        if not count:
             return await ctx.send(_("You don't have any pokémon, go get catching trainer!"))
-        _id = await conf.pokeid()
+        selected = await self.get_selected(user)
+        _id = selected[1] if selected is not None else 1
         await ctx.send(
             _("{user}'s selected Pokémon ID is {id}").format(user=user, id=_id),
             delete_after=5,
         )
         await PokeListMenu(
-            source=PokeList(pokemons),
+            source=PokeList(self, user.id, count),
             cog=self,
             ctx=ctx,
             user=user,
@@ -80,33 +72,20 @@ class GeneralMixin(MixinMeta):
             )
             return
         async with ctx.typing():
-            result = await self.cursor.fetch_all(
-                query=SELECT_POKEMON, values={"user_id": ctx.author.id}
-            )
-        pokemons = [None]
-        for data in result:
-            pokemons.append([json.loads(data[0]), data[1]])
-        if not pokemons:
-            return await ctx.send(_("You don't have any pokémon, trainer!"))
-        if id > len(pokemons):
+            await self.xpledger.evict(ctx.author.id)
+            data = await self.fetch_slot(ctx.author.id, id)
+        if data is None:
             return await ctx.send(
                 _(
                     "You don't have a pokemon at that slot.\nID refers to the position within your pokémon listing.\nThis is found at the bottom of the pokemon on `[p]list`"
                 )
             )
-        pokemon = pokemons[id]
-        pokemon[0]["nickname"] = nickname
-        await self.cursor.execute(
-            query=UPDATE_POKEMON,
-            values={
-                "user_id": ctx.author.id,
-                "message_id": pokemon[1],
-                "pokemon": json.dumps(pokemon[0]),
-            },
-        )
+        pokemon = data.pokemon
+        pokemon["nickname"] = nickname
+        await self.update_pokemon(ctx.author.id, data.message_id, pokemon)
         await ctx.send(
             _("Your {pokemon} has been nicknamed `{nickname}`").format(
-                pokemon=self.get_name(pokemon[0]["name"], ctx.author), nickname=nickname
+                pokemon=self.get_name(pokemon["name"], ctx.author), nickname=nickname
             )
         )
 
@@ -124,24 +103,16 @@ class GeneralMixin(MixinMeta):
         if id <= 0:
             return await ctx.send(_("The ID must be greater than 0!"))
         async with ctx.typing():
-            result = await self.cursor.fetch_all(
-                query=SELECT_POKEMON,
-                values={"user_id": ctx.author.id},
-            )
-        pokemons = [None]
-        for data in result:
-            pokemons.append([json.loads(data[0]), data[1]])
-        if not pokemons:
-            return await ctx.send(_("You don't have any pokémon, trainer!"))
-        if id >= len(pokemons):
+            await self.xpledger.evict(ctx.author.id)
+            data = await self.fetch_slot(ctx.author.id, id)
+        if data is None:
             return await ctx.send(
                 _(
                     "You don't have a pokemon at that slot.\nID refers to the position within your pokémon listing.\nThis is found at the bottom of the pokemon on `[p]list`"
                 )
             )
-        pokemon = pokemons[id]
-        name = self.get_name(pokemon[0]["name"], ctx.author)
-        if len(pokemons) == 2:
+        name = self.get_name(data.pokemon["name"], ctx.author)
+        if await self.count_pokemon(ctx.author.id) == 1:
             return await ctx.send(
                 _(
                     f"**{name}** is the last pokemon you've got. You cannot release it to the wilds."
@@ -160,23 +131,13 @@ class GeneralMixin(MixinMeta):
             return
 
         if pred.result:
+            await self.xpledger.evict(ctx.author.id)
             msg = ""
-            userconf = await self.user_is_global(ctx.author)
-            pokeid = await userconf.pokeid()
-            if id < pokeid:
-                msg += _(
-                    "\nYour default pokemon may have changed. I have tried to account for this change."
-                )
-                await userconf.pokeid.set(pokeid - 1)
-            elif id == pokeid:
+            if await self.deselect_pokemon(ctx.author, data.message_id):
                 msg += _(
                     "\nYou have released your selected pokemon. I have reset your selected pokemon to your first pokemon."
                 )
-                await userconf.pokeid.set(1)
-            await self.cursor.execute(
-                query="DELETE FROM users where message_id = :message_id",
-                values={"message_id": pokemon[1]},
-            )
+            await self.release_pokemon(data.message_id)
             await ctx.send(_("Your {name} has been freed.{msg}").format(name=name, msg=msg))
         else:
             await ctx.send(_("Operation cancelled."))
@@ -194,24 +155,17 @@ class GeneralMixin(MixinMeta):
                 ).format(prefix=ctx.clean_prefix)
             )
         async with ctx.typing():
-            result = await self.cursor.fetch_all(
-                query="""SELECT pokemon, message_id from users where user_id = :user_id""",
-                values={"user_id": ctx.author.id},
-            )
-            pokemons = [None]
-            for data in result:
-                pokemons.append([json.loads(data[0]), data[1]])
-            if not pokemons:
-                return await ctx.send(_("You don't have any pokemon to select."))
+            await self.xpledger.evict(ctx.author.id)
             if isinstance(_id, str):
                 if _id == "latest":
-                    _id = len(pokemons) - 1
+                    _id = await self.count_pokemon(ctx.author.id)
                 else:
                     await ctx.send(
                         _("Unidentified keyword, the only supported action is `latest` as of now.")
                     )
                     return
-            if _id < 1 or _id > len(pokemons) - 1:
+            data = await self.fetch_slot(ctx.author.id, _id)
+            if data is None:
                 return await ctx.send(
                     _(
                         "You've specified an invalid ID.\nID refers to the position within your pokémon listing.\nThis is found at the bottom of the pokemon on `[p]list`"
@@ -219,30 +173,25 @@ class GeneralMixin(MixinMeta):
                 )
             await ctx.send(
                 _("You have selected {pokemon} as your default pokémon.").format(
-                    pokemon=self.get_name(pokemons[_id][0]["name"], ctx.author)
+                    pokemon=self.get_name(data.pokemon["name"], ctx.author)
                 )
             )
-        conf = await self.user_is_global(ctx.author)
-        await conf.pokeid.set(_id)
-        await self.update_user_cache()
+        await self.set_selected(ctx.author, data.message_id)
 
     @commands.command()
     @commands.max_concurrency(1, commands.BucketType.user)
     async def pokedex(self, ctx):
         """Check your caught pokémon!"""
         async with ctx.typing():
-            pokemons = await self.config.user(ctx.author).pokeids()
-            pokemonlist = copy.deepcopy(self.pokemonlist)
-            for i, pokemon in enumerate(pokemonlist, start=1):
-                if str(pokemon) in pokemons:
-                    pokemonlist[i]["amount"] = pokemons[str(pokemon)]
-            a = [value for value in pokemonlist.items()]
-            chunked = [item for item in chunks(a, 20)]
+            result = await self.storage.pokedex(ctx.author.id)
+            pokemons = {str(species_id): amount for species_id, amount in result.items()}
+            userconf = self.usercache.get(ctx.author.id)
+            locale = userconf["locale"] if userconf is not None else "en"
             await GenericMenu(
-                source=PokedexFormat(chunked),
+                source=PokedexFormat(self.pokedex.pages(locale), pokemons),
                 delete_message_after=False,
                 cog=self,
-                len_poke=len(pokemonlist),
+                len_poke=len(self.pokedex),
             ).start(
                 ctx=ctx,
                 wait=False,
@@ -260,52 +209,49 @@ class GeneralMixin(MixinMeta):
             `--type`   | `--t` - Search pokemon by type.
             `--gender` | `--g` - Search by gender.
             `--iv` | - Search by total IV.
+            `--sort` | `--s` - Sort by `slot`, `level`, `id` or `iv`.
+            `--desc` - Sort in descending order.
+            `--limit` - Only show this many pokemon.
+
+        Filters can be combined. `--level`, `--id` and `--iv` take a number or a range such as
+        `30..50`, `>150` or `<=20`.
         """
+        filters = {key: args[key].lower() for key in ("variant", "gender", "type") if args[key]}
+        if args["names"]:
+            filters["names"] = list(
+                {self.species[key]["id"] for key in self.name_index.get(args["names"])}
+            )
+        ranges = {key: args[key] for key in ("level", "id", "iv") if args[key]}
+        line = _("{pokemon} **|** Level: {level} **|** ID: {id} **|** Index: {index}\n")
         async with ctx.typing():
-            result = await self.cursor.fetch_all(
-                query="""SELECT pokemon, message_id from users where user_id = :user_id""",
-                values={"user_id": ctx.author.id},
+            await self.xpledger.flush(ctx.author.id)
+            content = []
+            lines = []
+            length = 0
+            results = self.storage.search(
+                ctx.author.id,
+                filters,
+                ranges,
+                sort=args["sort"],
+                descending=args["desc"],
+                limit=args["limit"],
             )
-            if not result:
-                await ctx.send(_("You don't have any pokémon trainer!"))
-            pokemons = [None]
-            for data in result:
-                pokemons.append([json.loads(data[0]), data[1]])
-            correct = ""
-            for i, poke in enumerate(pokemons[1:], 1):
-                name = self.get_name(poke[0]["name"], ctx.author)
-                poke_str = _(
-                    "{pokemon} **|** Level: {level} **|** ID: {id} **|** Index: {index}\n"
-                ).format(pokemon=name, level=poke[0]["level"], id=poke[0]["id"], index=i)
-                if args["names"]:
-                    if name.lower() == args["names"].lower():
-                        correct += poke_str
-                elif args["level"]:
-                    if poke[0]["level"] == args["level"][0]:
-                        correct += poke_str
-                elif args["id"]:
-                    if poke[0]["id"] == args["id"][0]:
-                        correct += poke_str
-                elif args["variant"]:
-                    if poke[0].get("variant", "None").lower() == args["variant"].lower():
-                        correct += poke_str
-                elif args["iv"]:
-                    if sum(poke[0]["ivs"].values()) == args["iv"][0]:
-                        correct += poke_str
-                elif args["gender"]:
-                    if (
-                        args["gender"].lower()
-                        == poke[0].get("gender", "No Gender").lower().split()[0]
-                    ):
-                        correct += poke_str
-                elif args["type"]:
-                    if args["type"].lower() in [x.lower() for x in poke[0]["type"]]:
-                        correct += poke_str
+            async for name, level, species_id, slot in results:
+                entry = line.format(
+                    pokemon=self.get_name(name, ctx.author), level=level, id=species_id, index=slot
+                )
+                if lines and length + len(entry) > 1024:
+                    content.append("".join(lines))
+                    lines = []
+                    length = 0
+                lines.append(entry)
+                length += len(entry)
+            if lines:
+                content.append("".join(lines))
 
-            if not correct:
+            if not content:
                 await ctx.send("No pokémon returned for that search.")
                 return
-            content = list(pagify(correct, page_length=1024))
             await GenericMenu(
                 source=SearchFormat(content),
                 delete_message_after=False,
@@ -324,25 +270,12 @@ class GeneralMixin(MixinMeta):
             )
         user = ctx.author
         async with ctx.typing():
-            result = await self.cursor.fetch_all(query=SELECT_POKEMON, values={"user_id": user.id})
-        pokemons = []
-        for i, data in enumerate(result, start=1):
-            poke = json.loads(data[0])
-            poke["sid"] = i
-            pokemons.append(poke)
-        if not pokemons:
+            await self.xpledger.flush(user.id)
+            selected = await self.get_selected(user)
+        if selected is None:
             return await ctx.send(_("You don't have any pokémon, go get catching trainer!"))
-        _id = await conf.pokeid()
-        try:
-            pokemon = pokemons[_id - 1]
-        except IndexError:
-            await ctx.send(
-                _(
-                    "An error occured trying to find your pokemon at slot {slotnum}\nAs a result I have set your default pokemon to 1."
-                ).format(slotnum=_id)
-            )
-            await conf.pokeid.set(1)
-            return
         else:
+            _message_id, _id, pokemon = selected
+            pokemon["sid"] = _id
             embed, _file = await poke_embed(self, ctx, pokemon, file=True)
             await ctx.send(embed=embed, file=_file)
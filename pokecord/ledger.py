@@ -0,0 +1,164 @@
+import asyncio
+import contextlib
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .storage import Storage
+
+log = logging.getLogger("red.flare.pokecord.ledger")
+
+
+class LedgerEntry:
+    """A user's levelling pokemon as held in memory by the ledger."""
+
+    __slots__ = ("message_id", "selected", "pokemon", "dirty", "evolved")
+
+    def __init__(self, message_id: int, selected: int, pokemon: dict):
+        self.message_id = message_id
+        self.selected = selected
+        self.pokemon = pokemon
+        self.dirty = False
+        # Species IDs evolved into since the last flush, added to the pokedex with the write.
+        self.evolved = []
+
+
+class XPLedger:
+    """Write-behind store for XP gained from messages.
+
+    Doubles as the hot cache of each active user's levelling pokemon. XP is applied to the
+    cached pokemon and written back in batches, either by the background flush loop, on level
+    up or when the cog unloads. Anything that reads or changes a user's pokemon must flush or
+    evict that user first.
+    """
+
+    def __init__(self, storage: Storage, *, interval: int = 60, maxsize: int = 5000):
+        self.storage = storage
+        self.interval = interval
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[int, LedgerEntry]" = OrderedDict()
+        # Dirty entries pushed out of the cache, kept until the next flush writes them.
+        self._evicted: Dict[int, LedgerEntry] = {}
+        self._lock = asyncio.Lock()
+        self.gains = 0
+        self.writes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def pending(self) -> int:
+        return len(self._evicted) + sum(1 for entry in self._entries.values() if entry.dirty)
+
+    @property
+    def coalesced(self) -> int:
+        """Amount of XP gains that did not need a write of their own."""
+        return self.gains - self.writes - self.pending
+
+    def get(self, user_id: int) -> Optional[LedgerEntry]:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._entries.move_to_end(user_id)
+        return entry
+
+    def track(self, user_id: int, message_id: int, selected: int, pokemon: dict) -> LedgerEntry:
+        entry = LedgerEntry(message_id, selected, pokemon)
+        self._entries[user_id] = entry
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            uid, old = self._entries.popitem(last=False)
+            if old.dirty:
+                self._evicted[uid] = old
+        return entry
+
+    def mark_dirty(self, user_id: int):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        entry.dirty = True
+        self.gains += 1
+
+    async def flush(self, user_id: Optional[int] = None):
+        """Write dirty entries to the database, either for every user or a single one."""
+        async with self._lock:
+            if user_id is None:
+                entries = list(self._evicted.items())
+                entries += [(uid, entry) for uid, entry in self._entries.items() if entry.dirty]
+                self._evicted = {}
+            else:
+                entries = []
+                evicted = self._evicted.pop(user_id, None)
+                if evicted is not None:
+                    entries.append((user_id, evicted))
+                entry = self._entries.get(user_id)
+                if entry is not None and entry.dirty:
+                    entries.append((user_id, entry))
+            await self._write(entries)
+
+    async def _write(self, entries: List[Tuple[int, LedgerEntry]]):
+        """Write entries back, called with the lock held."""
+        if not entries:
+            return
+        values = []
+        pokedex = []
+        for uid, entry in entries:
+            entry.dirty = False
+            values.append((uid, entry.message_id, entry.pokemon))
+            pokedex += [(uid, _id) for _id in entry.evolved]
+        evolved = [(entry, entry.evolved) for _, entry in entries]
+        for _, entry in entries:
+            entry.evolved = []
+        try:
+            await self.storage.update(values, pokedex=pokedex)
+        except Exception:
+            for entry, species in evolved:
+                entry.evolved = species + entry.evolved
+            for uid, entry in entries:
+                entry.dirty = True
+                if self._entries.get(uid) is not entry:
+                    self._evicted.setdefault(uid, entry)
+            raise
+        self.writes += len(values)
+        log.debug(f"Flushed {len(values)} XP entries.")
+
+    def _take(self, message_id: int) -> List[Tuple[int, LedgerEntry]]:
+        """Forget and return every entry tracking a pokemon."""
+        taken = [
+            (uid, entry) for uid, entry in self._entries.items() if entry.message_id == message_id
+        ]
+        for uid, _ in taken:
+            del self._entries[uid]
+        for uid, entry in list(self._evicted.items()):
+            if entry.message_id == message_id:
+                taken.append((uid, self._evicted.pop(uid)))
+        return taken
+
+    @contextlib.asynccontextmanager
+    async def hold(self, message_id: int):
+        """Keep the ledger off a pokemon while it is changed or removed outside of it.
+
+        Pending XP for the pokemon is written first and flushes wait until the change is done.
+        Entries tracked from the old row in the meantime are dropped after it, so they are never
+        written over the change.
+        """
+        async with self._lock:
+            await self._write(
+                [(uid, entry) for uid, entry in self._take(message_id) if entry.dirty]
+            )
+            try:
+                yield
+            finally:
+                self._take(message_id)
+
+    async def evict(self, user_id: int):
+        """Flush and forget a user's entry, used before their pokemon are read or changed."""
+        await self.flush(user_id)
+        self._entries.pop(user_id, None)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as exc:
+                log.error("Exception flushing the XP ledger: ", exc_info=exc)
@@ -1,9 +1,8 @@
 import asyncio
 import contextlib
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import discord
-import tabulate
 from redbot.core import commands
 from redbot.core.i18n import Translator
 from redbot.core.utils.predicates import MessagePredicate
@@ -142,12 +141,47 @@ class PokeListMenu(menus.MenuPages, inherit_buttons=False):
         await self.ctx.invoke(command, _id=self.current_page + 1)
 
 
-class PokeList(menus.ListPageSource):
-    def __init__(self, entries: Iterable[str]):
-        super().__init__(entries, per_page=1)
+class PokeList(menus.PageSource):
+    """One pokemon per page, fetched by slot when the page is shown.
 
-    async def format_page(self, menu: PokeListMenu, pokemon: Dict) -> str:
-        embed = await poke_embed(menu.cog, menu.ctx, pokemon, menu=self)
+    Only the page being shown and the next few are kept decoded, so an open menu holds a
+    handful of pokemon rather than the whole collection.
+    """
+
+    def __init__(self, cog, user_id: int, count: int, *, lookahead: int = 2):
+        self.cog = cog
+        self.user_id = user_id
+        self.count = count
+        self.lookahead = lookahead
+        self._buffer: Dict[int, Tuple[dict, Tuple[int, int]]] = {}
+
+    def is_paginating(self):
+        return True
+
+    def get_max_pages(self):
+        return self.count
+
+    async def get_page(self, page_number: int) -> Tuple[dict, Tuple[int, int]]:
+        slot = page_number + 1
+        page = self._buffer.get(slot)
+        if page is None:
+            await self.cog.xpledger.flush(self.user_id)
+            result = await self.cog.storage.fetch_collection(
+                self.user_id, max(slot - 1, 1), slot + self.lookahead
+            )
+            self._buffer = {}
+            for data in result:
+                # Message ID and row version key the rendered embed.
+                self._buffer[data.slot] = data.pokemon, (data.message_id, data.version)
+            page = self._buffer.get(slot)
+            if page is None:
+                raise IndexError(page_number)  # Released while the menu was open.
+        page[0]["sid"] = slot
+        return page
+
+    async def format_page(self, menu: PokeListMenu, page: Tuple[dict, Tuple[int, int]]) -> str:
+        pokemon, key = page
+        embed = await poke_embed(menu.cog, menu.ctx, pokemon, menu=self, key=key)
         return embed
 
 
@@ -279,33 +313,27 @@ class SearchFormat(menus.ListPageSource):
 
 
 class PokedexFormat(menus.ListPageSource):
-    def __init__(self, entries: Iterable[str]):
+    def __init__(self, entries: Iterable[List[Tuple[str, str]]], caught: Dict[str, int]):
         super().__init__(entries, per_page=1)
+        self.caught = caught
 
-    async def format_page(self, menu: GenericMenu, item: List) -> str:
+    async def format_page(self, menu: GenericMenu, item: List[Tuple[str, str]]) -> str:
         embed = discord.Embed(title=_("Pokédex"), color=await menu.ctx.embed_colour())
         embed.set_footer(
             text=_("Showing {page}-{lenpages} of {amount}.").format(
                 page=item[0][0], lenpages=item[-1][0], amount=menu.len_poke
             )
         )
-        for pokemon in item:
-            if pokemon[1]["amount"] > 0:
-                msg = _("{amount} caught! \N{WHITE HEAVY CHECK MARK}").format(
-                    amount=pokemon[1]["amount"]
-                )
+        for _id, name in item:
+            amount = self.caught.get(_id, 0)
+            if amount > 0:
+                msg = _("{amount} caught! \N{WHITE HEAVY CHECK MARK}").format(amount=amount)
             else:
                 msg = _("Not caught yet! \N{CROSS MARK}")
-            embed.add_field(
-                name="{pokemonname} {pokemonid}".format(
-                    pokemonname=menu.cog.get_name(pokemon[1]["name"], menu.ctx.author),
-                    pokemonid=pokemon[1]["id"],
-                ),
-                value=msg,
-            )
+            embed.add_field(name=name, value=msg)
         if menu.current_page == 0:
             embed.description = _("You've caught {total} out of {amount} pokémon.").format(
-                total=len(await menu.cog.config.user(menu.ctx.author).pokeids()),
+                total=len(self.caught),
                 amount=menu.len_poke,
             )
         return embed
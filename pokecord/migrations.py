@@ -0,0 +1,309 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from databases import Database
+from redbot.core import Config
+
+from .functions import pokemon_row
+from .statements import (
+    COUNT_POKEMON_AFTER,
+    COUNT_UNMIGRATED_POKEMON,
+    COUNT_UNSLOTTED_USERS,
+    DELETE_MIGRATION,
+    INSERT_POKEDEX,
+    RECOUNT_POKEDEX,
+    SAVE_MIGRATION,
+    SELECT_MESSAGE_IDS,
+    SELECT_MIGRATION,
+    SELECT_POKEMON_AFTER,
+    SELECT_UNMIGRATED_POKEMON,
+    SELECT_UNSLOTTED_USERS,
+    UPDATE_POKEMON,
+    UPDATE_SLOT,
+)
+
+log = logging.getLogger("red.flare.pokecord.migrations")
+
+# The writes of a batch as (query, values) pairs, the checkpoint to resume after it and the
+# number of units it covers.
+Writes = List[Tuple[str, List[dict]]]
+Batch = Tuple[Writes, int, int]
+
+
+class Migration:
+    """One versioned migration step, run in batches.
+
+    Batches are read by keyset from a checkpoint and never rely on earlier batches having
+    been written, so a dry run walks the same batches a real run would.
+    """
+
+    version: int
+    description: str
+
+    def __init__(self, cog):
+        self.cog = cog
+
+    async def count(self, checkpoint: int) -> int:
+        """Units left to migrate after the checkpoint."""
+        raise NotImplementedError
+
+    def batches(self, checkpoint: int, size: int) -> AsyncIterator[Batch]:
+        raise NotImplementedError
+
+    async def finish(self):
+        """Called once every batch is written, for changes outside the database."""
+
+
+class FillLegacyPokemon(Migration):
+    version = 9
+    description = "Give genders and IVs to old pokemon and recount the pokedex"
+
+    async def count(self, checkpoint: int) -> int:
+        return await self.cog.cursor.fetch_val(
+            query=COUNT_POKEMON_AFTER, values={"after": checkpoint}
+        )
+
+    async def batches(self, checkpoint: int, size: int) -> AsyncIterator[Batch]:
+        while True:
+            result = await self.cog.cursor.fetch_all(
+                query=SELECT_POKEMON_AFTER, values={"after": checkpoint, "limit": size}
+            )
+            if not result:
+                break
+            values = []
+            for data in result:
+                poke = json.loads(data[1])
+                if not poke.get("gender", False):
+                    if isinstance(poke["name"], str):
+                        poke["gender"] = self.cog.gender_choose(poke["name"])
+                    else:
+                        poke["gender"] = self.cog.gender_choose(poke["name"]["english"])
+                if not poke.get("ivs", False):
+                    poke["ivs"] = {
+                        "HP": random.randint(0, 31),
+                        "Attack": random.randint(0, 31),
+                        "Defence": random.randint(0, 31),
+                        "Sp. Atk": random.randint(0, 31),
+                        "Sp. Def": random.randint(0, 31),
+                        "Speed": random.randint(0, 31),
+                    }
+                values.append(pokemon_row(data[3], data[2], poke))
+            checkpoint = result[-1][0]
+            yield [(UPDATE_POKEMON, values)], checkpoint, len(result)
+        # Every row now has its species column, so the pokedex is counted from them.
+        yield [(RECOUNT_POKEDEX, [{}])], checkpoint, 0
+
+    async def finish(self):
+        # Config counts are stale on databases this old, the table has just been rebuilt.
+        for user, data in (await self.cog.config.all_users()).items():
+            if data.get("pokeids"):
+                await self.cog.config.user_from_id(user).pokeids.clear()
+
+
+class FillColumns(Migration):
+    version = 10
+    description = "Fill the typed pokemon columns from their JSON"
+
+    async def count(self, checkpoint: int) -> int:
+        return await self.cog.cursor.fetch_val(
+            query=COUNT_UNMIGRATED_POKEMON, values={"after": checkpoint}
+        )
+
+    async def batches(self, checkpoint: int, size: int) -> AsyncIterator[Batch]:
+        while True:
+            result = await self.cog.cursor.fetch_all(
+                query=SELECT_UNMIGRATED_POKEMON, values={"after": checkpoint, "limit": size}
+            )
+            if not result:
+                return
+            values = [pokemon_row(data[3], data[2], json.loads(data[1])) for data in result]
+            checkpoint = result[-1][0]
+            yield [(UPDATE_POKEMON, values)], checkpoint, len(result)
+
+
+class NumberSlots(Migration):
+    version = 11
+    description = "Number the pokemon slots of each user in catch order"
+
+    async def count(self, checkpoint: int) -> int:
+        return await self.cog.cursor.fetch_val(
+            query=COUNT_UNSLOTTED_USERS, values={"after": checkpoint}
+        )
+
+    async def batches(self, checkpoint: int, size: int) -> AsyncIterator[Batch]:
+        while True:
+            users = await self.cog.cursor.fetch_all(
+                query=SELECT_UNSLOTTED_USERS, values={"after": checkpoint, "limit": size}
+            )
+            if not users:
+                return
+            values = []
+            for user in users:
+                result = await self.cog.cursor.fetch_all(
+                    query=SELECT_MESSAGE_IDS, values={"user_id": user[0]}
+                )
+                values.extend(
+                    {"message_id": data[0], "slot": slot}
+                    for slot, data in enumerate(result, start=1)
+                )
+            checkpoint = users[-1][0]
+            yield [(UPDATE_SLOT, values)], checkpoint, len(users)
+
+
+class MovePokedex(Migration):
+    version = 12
+    description = "Move pokedex counts out of config into the pokedex table"
+
+    async def _users(self, checkpoint: int) -> List[Tuple[int, dict]]:
+        users = await self.cog.config.all_users()
+        return sorted(
+            (user, data["pokeids"])
+            for user, data in users.items()
+            if user > checkpoint and data.get("pokeids")
+        )
+
+    async def count(self, checkpoint: int) -> int:
+        return len(await self._users(checkpoint))
+
+    async def batches(self, checkpoint: int, size: int) -> AsyncIterator[Batch]:
+        users = await self._users(checkpoint)
+        for i in range(0, len(users), size):
+            batch = users[i : i + size]
+            values = [
+                {"user_id": user, "species_id": int(_id), "amount": amount}
+                for user, pokeids in batch
+                for _id, amount in pokeids.items()
+            ]
+            yield [(INSERT_POKEDEX, values)], batch[-1][0], len(batch)
+
+    async def finish(self):
+        for user, _ in await self._users(0):
+            await self.cog.config.user_from_id(user).pokeids.clear()
+
+
+MIGRATIONS = [FillLegacyPokemon, FillColumns, NumberSlots, MovePokedex]
+
+
+class Migrator:
+    """Runs the pending migration steps in order, in the background.
+
+    Each batch is written in one transaction together with the step's checkpoint, so an
+    interrupted migration picks up after the last batch it wrote. The config version is only
+    raised once a step has finished.
+    """
+
+    def __init__(
+        self,
+        cursor: Database,
+        config: Config,
+        cog,
+        *,
+        batch: int = 500,
+        interval: float = 10,
+    ):
+        self.cursor = cursor
+        self.config = config
+        self.steps = [migration(cog) for migration in MIGRATIONS]
+        self.batch = batch
+        self.interval = interval
+        self.done = asyncio.Event()
+        self.current: Optional[Migration] = None
+        self.migrated = 0
+        self.total = 0
+        # The last failure and when the failed run will be retried, on the monotonic clock.
+        self.error: Optional[Exception] = None
+        self.failures = 0
+        self.retry_at: Optional[float] = None
+
+    async def run_until_done(self, *, delay: float = 30, max_delay: float = 1800):
+        """Run the pending steps, retrying with backoff until they all succeed.
+
+        Failed runs resume from their checkpoints, `done` is set once nothing is pending."""
+        while True:
+            try:
+                await self.run()
+            except Exception as exc:
+                self.current = None
+                self.error = exc
+                self.failures += 1
+                self.retry_at = time.monotonic() + delay
+                log.error(
+                    f"Exception migrating the pokemon database, retrying in {delay:.0f}s: ",
+                    exc_info=exc,
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, max_delay)
+            else:
+                self.error = None
+                self.retry_at = None
+                self.done.set()
+                return
+
+    async def pending(self) -> List[Migration]:
+        version = await self.config.migration()
+        return [step for step in self.steps if step.version > version]
+
+    async def checkpoint(self, step: Migration) -> Tuple[int, int]:
+        """The checkpoint to resume the step from and how many units it had migrated."""
+        data = await self.cursor.fetch_one(
+            query=SELECT_MIGRATION, values={"version": step.version}
+        )
+        return (data[0], data[1]) if data is not None else (0, 0)
+
+    async def _write(self, step: Migration, writes: Writes, checkpoint: int, migrated: int):
+        async with self.cursor.transaction():
+            for query, values in writes:
+                if values:
+                    await self.cursor.execute_many(query=query, values=values)
+            await self.cursor.execute(
+                query=SAVE_MIGRATION,
+                values={"version": step.version, "checkpoint": checkpoint, "migrated": migrated},
+            )
+
+    async def run(self, *, dry_run: bool = False) -> Dict[int, int]:
+        """Run every pending step, returning how many units each covered.
+
+        A dry run reads every batch but writes nothing and leaves the version alone. It keeps
+        its progress to itself, so it can't mix with a real run's counts or status."""
+        counts = {}
+        for step in await self.pending():
+            checkpoint, migrated = await self.checkpoint(step)
+            total = migrated + await step.count(checkpoint)
+            if not dry_run:
+                self.current, self.migrated, self.total = step, migrated, total
+            action = "Checking" if dry_run else "Running"
+            resumed = f", resuming at {migrated}" if migrated else ""
+            log.info(
+                f"{action} migration {step.version} ({step.description}): "
+                f"{total} to migrate{resumed}."
+            )
+            start = last = time.monotonic()
+            async for writes, checkpoint, units in step.batches(checkpoint, self.batch):
+                migrated += units
+                if not dry_run:
+                    await self._write(step, writes, checkpoint, migrated)
+                    self.migrated = migrated
+                if time.monotonic() - last >= self.interval:
+                    last = time.monotonic()
+                    log.info(
+                        f"Migration {step.version}: {migrated}/{total} "
+                        f"({migrated / total if total else 1:.1%})."
+                    )
+                await asyncio.sleep(0)
+            counts[step.version] = migrated
+            if dry_run:
+                continue
+            await step.finish()
+            await self.config.migration.set(step.version)
+            await self.cursor.execute(query=DELETE_MIGRATION, values={"version": step.version})
+            log.info(
+                f"Migration {step.version} complete, {migrated} migrated in "
+                f"{time.monotonic() - start:.1f}s."
+            )
+        if not dry_run:
+            self.current = None
+        return counts
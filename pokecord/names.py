@@ -0,0 +1,97 @@
+import string
+import unicodedata
+from typing import Dict, Iterable, Tuple
+
+from .catalog import species_key
+
+PUNCT = string.punctuation + "’"
+_STRIP_PUNCT = str.maketrans("", "", PUNCT)
+
+STARTERS = (
+    "Bulbasaur",
+    "Charmander",
+    "Squirtle",
+    "Chikorita",
+    "Cyndaquil",
+    "Totodile",
+    "Treecko",
+    "Torchic",
+    "Mudkip",
+    "Turtwig",
+    "Chimchar",
+    "Piplup",
+    "Snivy",
+    "Tepig",
+    "Oshawott",
+    "Chespin",
+    "Fennekin",
+    "Froakie",
+    "Rowlet",
+    "Litten",
+    "Popplio",
+    "Grookey",
+    "Scorbunny",
+    "Sobble",
+)
+
+
+def normalise(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+def fold_accents(name: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", name)
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+class NameIndex:
+    """Lookup from every name a pokemon can be caught by to its species keys.
+
+    Covers the name in every locale, the English name without punctuation, the alias and
+    accent-free spellings of Latin names. Keys are kept in catalog order.
+    """
+
+    def __init__(self, pokemons: Iterable[dict]):
+        index: Dict[str, Dict[str, None]] = {}
+        self.keys: Dict[str, str] = {}
+        for pokemon in pokemons:
+            key = species_key(pokemon)
+            self.keys.setdefault(normalise(key), key)
+            for name in self.names_for(pokemon):
+                index.setdefault(name, {})[key] = None
+        self._index: Dict[str, Tuple[str, ...]] = {
+            name: tuple(keys) for name, keys in index.items()
+        }
+
+    def __len__(self):
+        return len(self._index)
+
+    @staticmethod
+    def names_for(pokemon: dict) -> set:
+        names = {normalise(name) for name in pokemon["name"].values() if name is not None}
+        names.add(normalise(pokemon["name"]["english"].translate(_STRIP_PUNCT)))
+        if pokemon.get("alias"):
+            names.add(normalise(pokemon["alias"]))
+        for name in list(names):
+            folded = fold_accents(name)
+            if folded != name and folded.isascii():
+                names.add(folded)
+        return names
+
+    def get(self, name: str) -> Tuple[str, ...]:
+        """Species keys that go by this name, in catalog order."""
+        name = normalise(name)
+        keys = self._index.get(name)
+        if keys is None:
+            keys = self._index.get(fold_accents(name), ())
+        return keys
+
+    def matches(self, name: str, key: str) -> bool:
+        return key in self.get(name)
+
+    def find(self, name: str) -> Tuple[str, ...]:
+        """Species keys for a name, preferring an exact species key such as an alias."""
+        key = self.keys.get(normalise(name))
+        if key is not None:
+            return (key,)
+        return self.get(name)
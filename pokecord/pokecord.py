@@ -1,35 +1,45 @@
-import asyncio
 import concurrent.futures
-import datetime
-import json
+import copy
+import functools
 import logging
 import random
-import string
+import time
 from abc import ABC
+from typing import Optional, Tuple
 
-import apsw
 import discord
+import tabulate
 from databases import Database
 from redbot.core import Config, commands
 from redbot.core.data_manager import bundled_data_path, cog_data_path
 from redbot.core.i18n import Translator, cog_i18n, set_contextual_locales_from_guild
-from redbot.core.utils.chat_formatting import escape, humanize_list
+from redbot.core.utils.chat_formatting import box, escape, humanize_list, pagify
 
+from .cache import EmbedCache, UserCache
+from .catalog import load as load_catalog, species_key
 from .dev import Dev
+from .evolutions import EvolutionIndex
 from .general import GeneralMixin
+from .ledger import XPLedger
+from .migrations import Migrator
+from .names import STARTERS, NameIndex
+from .pokedex import LOCALE_NAMES, Pokedex
+from .sampler import AliasSampler
 from .settings import SettingsMixin
+from .simulation import SpawnSimulation
+from .spawns import ChannelSpawns, SpawnCounters, SpawnScheduler
+from .sprites import SpriteCache
 from .statements import *
+from .storage import Storage, StoredPokemon, open_storage
 from .trading import TradeMixin
 
 log = logging.getLogger("red.flare.pokecord")
 
-PUNCT = string.punctuation + "’"
 _ = Translator("Pokecord", __file__)
 GENDERS = [
     "Male \N{MALE SIGN}\N{VARIATION SELECTOR-16}",
     "Female \N{FEMALE SIGN}\N{VARIATION SELECTOR-16}",
 ]
-_MIGRATION_VERSION = 9
 
 
 class CompositeMetaClass(type(commands.Cog), type(ABC)):
@@ -67,7 +77,12 @@ class Pokecord(
             spawnchance=[20, 120],
             hintcost=1000,
             spawnloop=False,
+            spawninterval=2400,
             migration=1,
+            spritecache=32,
+            spriteprewarm=True,
+            spriteset="original",
+            storage="databases",
         )
         defaults_guild = {
             "activechannels": [],
@@ -78,29 +93,70 @@ class Pokecord(
         }
         self.config.register_guild(**defaults_guild)
         defaults_user = {
-            "pokeids": {},
+            "pokeids": {},  # Moved to the pokedex table, kept for migrating.
             "silence": False,
             "timestamp": 0,
-            "pokeid": 1,
+            "pokeid": 1,  # Slot selected before selections were stored by message ID.
+            "selected": None,
             "has_starter": False,
             "locale": "en",
         }
         self.config.register_user(**defaults_user)
         self.config.register_member(**defaults_user)
-        self.config.register_channel(pokemon=None)
+        self.config.register_channel(pokemon=None)  # Species key of the current spawn
         self.datapath = f"{bundled_data_path(self)}"
-        self.maybe_spawn = {}
+        self.spawncounters = SpawnCounters()
+        self.spawnscheduler = SpawnScheduler(self.random_spawn_guilds, self.random_spawn_guild)
         self.guildcache = {}
-        self.usercache = {}
+        self.usercache = UserCache(self.config)
+        self.embedcache = EmbedCache()
         self.spawnchance = []
-        self.cursor = Database(f"sqlite:///{cog_data_path(self)}/pokemon.db")
+        self.dbpath = f"{cog_data_path(self)}/pokemon.db"
+        self.cursor = Database(f"sqlite:///{self.dbpath}")
         self._executor = concurrent.futures.ThreadPoolExecutor(1)
+        # Both are set up in initalize, once the storage backend is read from config.
+        self.storage: Optional[Storage] = None
+        self.xpledger: Optional[XPLedger] = None
+        self.migrator = Migrator(self.cursor, self.config, self)
+        self.sprites = SpriteCache(self.datapath)
+        self.spawns = ChannelSpawns(self.config)
         self.bg_loop_task = None
+        self.xp_flush_task = None
+        self.prewarm_task = None
+        self.spawn_flush_task = None
+        self.migration_task = None
 
-    def cog_unload(self):
-        self._executor.shutdown()
+    async def cog_unload(self):
         if self.bg_loop_task:
             self.bg_loop_task.cancel()
+        if self.xp_flush_task:
+            self.xp_flush_task.cancel()
+        if self.prewarm_task:
+            self.prewarm_task.cancel()
+        self.sprites.close()
+        if self.spawn_flush_task:
+            self.spawn_flush_task.cancel()
+        if self.migration_task:
+            self.migration_task.cancel()
+        await self.spawns.flush()
+        if self.xpledger is not None:
+            await self.xpledger.flush()
+        if self.storage is not None:
+            await self.storage.close()
+        self._executor.shutdown()
+
+    async def cog_before_invoke(self, ctx):
+        if not self.migrator.done.is_set() and self.dev not in ctx.command.parents:
+            if self.migrator.error is not None:
+                await ctx.send(
+                    _(
+                        "Pokecord's database update failed and will be retried, please let the bot owner know."
+                    )
+                )
+            else:
+                await ctx.send(_("Pokecord is updating its database, please try again shortly."))
+            raise commands.CheckFailure()
+        await self.usercache.load(ctx.author.id)
 
     async def initalize(self):
         await self.cursor.connect()
@@ -108,134 +164,158 @@ class Pokecord(
         await self.cursor.execute(PRAGMA_wal_autocheckpoint)
         await self.cursor.execute(PRAGMA_read_uncommitted)
         await self.cursor.execute(POKECORD_CREATE_POKECORD_TABLE)
-        with open(f"{self.datapath}/pokedex.json", encoding="utf-8") as f:
-            pdata = json.load(f)
-        with open(f"{self.datapath}/evolve.json", encoding="utf-8") as f:
-            self.evolvedata = json.load(f)
-        with open(f"{self.datapath}/genders.json", encoding="utf-8") as f:
-            self.genderdata = json.load(f)
-        with open(f"{self.datapath}/shiny.json", encoding="utf-8") as f:
-            sdata = json.load(f)
-        with open(f"{self.datapath}/legendary.json", encoding="utf-8") as f:
-            ldata = json.load(f)
-        with open(f"{self.datapath}/mythical.json", encoding="utf-8") as f:
-            mdata = json.load(f)
-        with open(f"{self.datapath}/galarian.json", encoding="utf-8") as f:
-            gdata = json.load(f)
-        with open(f"{self.datapath}/hisuian.json", encoding="utf-8") as f:
-            gdata = json.load(f)
-        with open(f"{self.datapath}/paldea.json", encoding="utf-8") as f:
-            gdata = json.load(f)
-        with open(f"{self.datapath}/alolan.json", encoding="utf-8") as f:
-            adata = json.load(f)
-        with open(f"{self.datapath}/megas.json", encoding="utf-8") as f:
-            megadata = json.load(f)
-        self.pokemondata = pdata + sdata + ldata + mdata + gdata + adata + megadata
-        with open(f"{self.datapath}/url.json", encoding="utf-8") as f:
-            url = json.load(f)
-        for pokemon in self.pokemondata:
-            name = (
-                pokemon["name"]["english"]
-                if not pokemon.get("variant")
-                else pokemon.get("alias")
-                if pokemon.get("alias")
-                else pokemon["name"]["english"]
-            )
-            if "shiny" in name.lower():
-                continue
-            link = url[name]
-            if isinstance(link, list):
-                link = link[0]
-            pokemon["url"] = link
-
-        self.spawnchances = [x["spawnchance"] for x in self.pokemondata]
-        self.pokemonlist = {
-            pokemon["id"]: {
-                "name": pokemon["name"],
-                "amount": 0,
-                "id": f"#{str(pokemon['id']).zfill(3)}",
-            }
-            for pokemon in sorted((self.pokemondata), key=lambda x: x["id"])
-        }
-        if await self.config.migration() < _MIGRATION_VERSION:
-            self.usercache = await self.config.all_users()
-            for user in self.usercache:
-                await self.config.user_from_id(user).pokeids.clear()
-                result = await self.cursor.fetch_all(
-                    query=SELECT_POKEMON,
-                    values={"user_id": user},
-                )
-                async with self.config.user_from_id(user).pokeids() as pokeids:
-                    for data in result:
-                        poke = json.loads(data[0])
-                        if str(poke["id"]) not in pokeids:
-                            pokeids[str(poke["id"])] = 1
-                        else:
-                            pokeids[str(poke["id"])] += 1
-
-                        if not poke.get("gender", False):
-                            if isinstance(poke["name"], str):
-                                poke["gender"] = self.gender_choose(poke["name"])
-                            else:
-                                poke["gender"] = self.gender_choose(poke["name"]["english"])
-
-                        if not poke.get("ivs", False):
-                            poke["ivs"] = {
-                                "HP": random.randint(0, 31),
-                                "Attack": random.randint(0, 31),
-                                "Defence": random.randint(0, 31),
-                                "Sp. Atk": random.randint(0, 31),
-                                "Sp. Def": random.randint(0, 31),
-                                "Speed": random.randint(0, 31),
-                            }
-
-                        await self.cursor.execute(
-                            query=UPDATE_POKEMON,
-                            values={
-                                "user_id": user,
-                                "message_id": data[1],
-                                "pokemon": json.dumps(poke),
-                            },
-                        )
-                await self.config.migration.set(_MIGRATION_VERSION)
-            log.info("Pokecord Migration complete.")
+        await self.cursor.execute(POKECORD_CREATE_POKEDEX_TABLE)
+        await self.cursor.execute(POKECORD_CREATE_MIGRATIONS_TABLE)
+        await self.create_columns()
+        self.storage = open_storage(
+            await self.config.storage(),
+            database=self.cursor,
+            url=f"sqlite:///{self.dbpath}",
+            path=self.dbpath,
+            executor=self._executor,
+        )
+        await self.storage.connect()
+        self.xpledger = XPLedger(self.storage)
+        start = time.perf_counter()
+        catalog = await self.bot.loop.run_in_executor(None, load_catalog, self.datapath)
+        self.pokemondata = catalog["pokemon"]
+        self.evolvedata = catalog["evolve"]
+        self.genderdata = catalog["genders"]
+        log.debug(
+            f"Loaded catalog {catalog['version']} with {len(self.pokemondata)} pokemon in "
+            f"{(time.perf_counter() - start) * 1000:.1f}ms."
+        )
+
+        self.species = {species_key(pokemon): pokemon for pokemon in self.pokemondata}
+        self.name_index = NameIndex(self.pokemondata)
+        self.evolutions = EvolutionIndex(self.evolvedata, self.pokemondata)
+        self.spawnsim = SpawnSimulation(self.pokemondata)
+        self.spawner = AliasSampler(self.pokemondata, [x["spawnchance"] for x in self.pokemondata])
+        self.pokedex = Pokedex(self.pokemondata)
+        self.migration_task = self.bot.loop.create_task(self.migrator.run_until_done())
 
         await self.update_guild_cache()
         await self.update_spawn_chance()
-        await self.update_user_cache()
+        self.xp_flush_task = self.bot.loop.create_task(self.xpledger.run())
+        await self.spawns.load(self.species)
+        self.spawn_flush_task = self.bot.loop.create_task(self.spawns.run())
+        self.sprites.resize(await self.config.spritecache())
+        self.sprites.use(await self.config.spriteset())
+        if await self.config.spriteprewarm():
+            self.prewarm_task = self.bot.loop.create_task(self.sprites.prewarm(self.pokemondata))
+        self.spawnscheduler.set_interval(await self.config.spawninterval())
         if await self.config.spawnloop():
             self.bg_loop_task = self.bot.loop.create_task(self.random_spawn())
 
+    async def create_columns(self):
+        """Add the typed pokemon columns and their indexes to databases created before them."""
+        columns = {row[1] for row in await self.cursor.fetch_all(query=PRAGMA_table_info)}
+        for column, _type in POKEMON_COLUMNS.items():
+            if column not in columns:
+                await self.cursor.execute(f"ALTER TABLE users ADD COLUMN {column} {_type};")
+        for index in POKECORD_CREATE_INDEXES:
+            await self.cursor.execute(index)
+
+    async def fetch_slot(self, user_id: int, slot: int) -> Optional[StoredPokemon]:
+        """Fetch the pokemon in a user's slot, if any."""
+        return await self.storage.fetch_one(user_id, slot)
+
+    async def count_pokemon(self, user_id: int) -> int:
+        return await self.storage.count(user_id)
+
+    async def get_selected(self, user) -> Optional[Tuple[int, int, dict]]:
+        """Fetch the message ID, slot and pokemon of a user's selected pokemon.
+
+        Users without a valid selection are moved onto their first pokemon."""
+        userconf = await self.usercache.load(user.id)
+        selected = userconf["selected"]
+        if selected is not None:
+            data = await self.storage.fetch_by_id(selected)
+            if data is not None and data.user_id == user.id:
+                return selected, data.slot, data.pokemon
+        slot = userconf["pokeid"] if selected is None else 1
+        data = await self.fetch_slot(user.id, slot)
+        if data is None and slot != 1:
+            slot = 1
+            data = await self.fetch_slot(user.id, slot)
+        if data is None:
+            return None
+        await self.set_selected(user, data.message_id)
+        return data.message_id, slot, data.pokemon
+
+    async def set_selected(self, user, message_id: Optional[int]):
+        """Point a user's selection at a pokemon, or back at their first pokemon with None."""
+        conf = await self.user_is_global(user)
+        await conf.selected.set(message_id)
+        if message_id is None:
+            await conf.pokeid.set(1)
+        self.usercache.invalidate(user.id)
+
+    async def deselect_pokemon(self, user, message_id: int) -> bool:
+        """Reset a user's selection to their first pokemon if it points at this pokemon.
+
+        Returns whether the pokemon was selected."""
+        selected = await self.get_selected(user)
+        if selected is None or selected[0] != message_id:
+            return False
+        await self.set_selected(user, None)
+        return True
+
+    async def update_pokemon(self, user_id: int, message_id: int, pokemon: dict):
+        """Write a pokemon changed outside of the XP ledger.
+
+        Entries the ledger tracked from the old row meanwhile are dropped, not written over it."""
+        async with self.xpledger.hold(message_id):
+            await self.storage.update([(user_id, message_id, pokemon)])
+
+    async def release_pokemon(self, message_id: int) -> bool:
+        """Delete a pokemon and move its owner's later pokemon down a slot.
+
+        The XP ledger stops tracking it, even if it was tracked again since its owner was evicted.
+        Returns False if the pokemon no longer exists."""
+        async with self.xpledger.hold(message_id):
+            if not await self.storage.delete(message_id):
+                return False
+        self.embedcache.invalidate(message_id)
+        return True
+
+    async def transfer_pokemon(self, message_id: int, user_id: int, new_message_id: int) -> bool:
+        """Move a pokemon to the end of another user's slots.
+
+        The XP ledger stops tracking it under the old owner, as with `release_pokemon`.
+        Returns False if the pokemon no longer exists."""
+        async with self.xpledger.hold(message_id):
+            if not await self.storage.transfer(message_id, user_id, new_message_id):
+                return False
+        self.embedcache.invalidate(message_id)
+        return True
+
     async def random_spawn(self):
         await self.bot.wait_until_ready()
         log.debug("Starting loop for random spawns.")
-        while True:
-            try:
-                for guild in self.guildcache:
-                    if (
-                        self.guildcache[guild]["toggle"]
-                        and self.guildcache[guild]["activechannels"]
-                    ):
-                        if random.randint(1, 2) == 2:
-                            continue
-                        _guild = self.bot.get_guild(int(guild))
-                        if _guild is None:
-                            continue
-                        channel = _guild.get_channel(
-                            int(random.choice(self.guildcache[guild]["activechannels"]))
-                        )
-                        if channel is None:
-                            continue
-                        await self.spawn_pokemon(channel)
-                await asyncio.sleep(2400)
-            except Exception as exc:
-                log.error("Exception in pokemon auto spawning: ", exc_info=exc)
+        await self.spawnscheduler.run()
+
+    def random_spawn_guilds(self):
+        return (
+            guild
+            for guild, data in self.guildcache.items()
+            if data["toggle"] and data["activechannels"]
+        )
+
+    async def random_spawn_guild(self, guild_id: int):
+        _guild = self.bot.get_guild(int(guild_id))
+        if _guild is None:
+            return
+        channel = _guild.get_channel(
+            int(random.choice(self.guildcache[guild_id]["activechannels"]))
+        )
+        if channel is None:
+            return
+        await self.spawn_pokemon(channel)
 
     async def update_guild_cache(self):
         self.guildcache = await self.config.all_guilds()
-
-    async def update_user_cache(self):
-        self.usercache = await self.config.all_users()  # TODO: Support guild
+        self.spawnscheduler.refresh()
 
     async def update_spawn_chance(self):
         self.spawnchance = await self.config.spawnchance()
@@ -253,7 +333,7 @@ class Pokecord(
         return self.config.member(user)
 
     def pokemon_choose(self):
-        return random.choices(self.pokemondata, weights=self.spawnchances, k=1)[0]
+        return self.spawner.choice()
 
     def gender_choose(self, name):
         poke = self.genderdata.get(name, None)
@@ -270,25 +350,7 @@ class Pokecord(
         userconf = self.usercache.get(user.id)
         if userconf is None:
             return names["english"]
-        localnames = {
-            "en": names["english"],
-            "fr": names["french"],
-            "tw": names["chinese"],
-            "jp": names["japanese"],
-        }
-        return (
-            localnames[self.usercache[user.id]["locale"]]
-            if localnames[self.usercache[user.id]["locale"]] is not None
-            else localnames["en"]
-        )
-
-    def get_pokemon_name(self, pokemon: dict) -> set:
-        """function returns all name for specified pokemon"""
-        return {
-            pokemon["name"][name].lower()
-            for name in pokemon["name"]
-            if pokemon["name"][name] is not None
-        }
+        return names[LOCALE_NAMES[userconf["locale"]]] or names["english"]
 
     @commands.command()
     async def starter(self, ctx, pokemon: str = None):
@@ -314,37 +376,10 @@ class Pokecord(
             )
             await ctx.send(msg)
             return
-        starter_pokemon = {
-            "bulbasaur": self.pokemondata[0],
-            "charmander": self.pokemondata[3],
-            "squirtle": self.pokemondata[6],
-            "chikorita": self.pokemondata[146],
-            "cyndaquil": self.pokemondata[149],
-            "totodile": self.pokemondata[152],
-            "treecko": self.pokemondata[240],
-            "torchic": self.pokemondata[243],
-            "mudkip": self.pokemondata[246],
-            "turtwig": self.pokemondata[365],
-            "chimchar": self.pokemondata[368],
-            "piplup": self.pokemondata[371],
-            "snivy": self.pokemondata[458],
-            "tepig": self.pokemondata[461],
-            "oshawott": self.pokemondata[464],
-            "chespin": self.pokemondata[601],
-            "fennekin": self.pokemondata[604],
-            "froakie": self.pokemondata[607],
-            "rowlet": self.pokemondata[668],
-            "litten": self.pokemondata[671],
-            "popplio": self.pokemondata[674],
-            "grookey": self.pokemondata[740],
-            "scorbunny": self.pokemondata[743],
-            "sobble": self.pokemondata[746],
-        }
-
-        for starter in starter_pokemon.values():
-            if pokemon.lower() in self.get_pokemon_name(starter):
+        for key in self.name_index.get(pokemon):
+            if key in STARTERS:
+                starter = copy.deepcopy(self.species[key])
                 break
-
         else:
             return await ctx.send(_("That's not a valid starter pokémon, trainer!"))
 
@@ -365,23 +400,17 @@ class Pokecord(
         }
         starter["gender"] = self.gender_choose(starter["name"]["english"])
 
-        await self.cursor.execute(
-            query=INSERT_POKEMON,
-            values={
-                "user_id": ctx.author.id,
-                "message_id": ctx.message.id,
-                "pokemon": json.dumps(starter),
-            },
-        )
+        await self.storage.insert(ctx.author.id, ctx.message.id, starter)
         await conf.has_starter.set(True)
+        self.usercache.invalidate(ctx.author.id)
 
     @commands.command()
     @commands.cooldown(1, 30, commands.BucketType.member)
     async def hint(self, ctx):
         """Get a hint on the pokémon!"""
-        pokemonspawn = await self.config.channel(ctx.channel).pokemon()
-        if pokemonspawn is not None:
-            name = self.get_name(pokemonspawn["name"], ctx.author)
+        key = self.spawns.get(ctx.channel.id)
+        if key is not None:
+            name = self.get_name(self.species[key]["name"], ctx.author)
             inds = [i for i, _ in enumerate(name)]
             if len(name) > 6:
                 amount = len(name) - random.randint(2, 4)
@@ -414,21 +443,13 @@ class Pokecord(
                     "You haven't chosen a starter pokemon yet, check out `{prefix}starter` for more information."
                 ).format(prefix=ctx.clean_prefix)
             )
-        pokemonspawn = await self.config.channel(ctx.channel).pokemon()
-        if pokemonspawn is not None:
-            names = self.get_pokemon_name(pokemonspawn)
-            names.add(
-                pokemonspawn["name"]["english"].translate(str.maketrans("", "", PUNCT)).lower()
-            )
-            if pokemonspawn.get("alias"):
-                names.add(pokemonspawn["alias"].lower())
-            if pokemon.lower() not in names:
+        key = self.spawns.get(ctx.channel.id)
+        if key is not None:
+            if not self.name_index.matches(pokemon, key):
                 return await ctx.send(_("That's not the correct pokemon"))
-            if await self.config.channel(ctx.channel).pokemon() is not None:
-                await self.config.channel(ctx.channel).pokemon.clear()
-            else:
-                await ctx.send("No pokemon is ready to be caught.")
-                return
+            if not self.spawns.claim(ctx.channel.id, key):
+                return await ctx.send(_("No pokemon is ready to be caught."))
+            pokemonspawn = copy.deepcopy(self.species[key])
             lvl = random.randint(1, 13)
             pokename = self.get_name(pokemonspawn["name"], ctx.author)
             variant = f'{pokemonspawn.get("variant")} ' if pokemonspawn.get("variant") else ""
@@ -441,15 +462,6 @@ class Pokecord(
                 pokename=pokename,
             )
 
-            async with conf.pokeids() as poke:
-                if str(pokemonspawn["id"]) not in poke:
-                    msg += _("\n{pokename} has been added to the pokédex.").format(
-                        pokename=pokename
-                    )
-
-                    poke[str(pokemonspawn["id"])] = 1
-                else:
-                    poke[str(pokemonspawn["id"])] += 1
             pokemonspawn["level"] = lvl
             pokemonspawn["xp"] = 0
             pokemonspawn["gender"] = self.gender_choose(pokemonspawn["name"]["english"])
@@ -461,21 +473,14 @@ class Pokecord(
                 "Sp. Def": random.randint(0, 31),
                 "Speed": random.randint(0, 31),
             }
-            await self.cursor.execute(
-                query=INSERT_POKEMON,
-                values={
-                    "user_id": ctx.author.id,
-                    "message_id": ctx.message.id,
-                    "pokemon": json.dumps(pokemonspawn),
-                },
-            )
+            if await self.storage.insert(
+                ctx.author.id, ctx.message.id, pokemonspawn, pokedex=True
+            ):
+                msg += _("\n{pokename} has been added to the pokédex.").format(pokename=pokename)
             await ctx.send(msg)
             return
         await ctx.send(_("No pokemon is ready to be caught."))
 
-    def spawn_chance(self, guildid):
-        return self.maybe_spawn[guildid]["amount"] > self.maybe_spawn[guildid]["spawnchance"]
-
     # async def get_hash(self, pokemon):
     #     return (await self.config.hashes()).get(pokemon, None)
 
@@ -485,6 +490,8 @@ class Pokecord(
             return
         if message.author.bot:
             return
+        if not self.migrator.done.is_set():
+            return
         guildcache = self.guildcache.get(message.guild.id)
         if guildcache is None:
             return
@@ -497,25 +504,10 @@ class Pokecord(
         elif guildcache["blacklist"]:
             if message.channel.id in guildcache["blacklist"]:
                 return
-        if message.guild.id not in self.maybe_spawn:
-            self.maybe_spawn[message.guild.id] = {
-                "amount": 1,
-                "spawnchance": random.randint(self.spawnchance[0], self.spawnchance[1]),
-                "time": datetime.datetime.utcnow().timestamp(),
-                "author": message.author.id,
-            }  # TODO: big value
-        if (
-            self.maybe_spawn[message.guild.id]["author"] == message.author.id
-        ):  # stop spamming to spawn
-            if (
-                datetime.datetime.utcnow().timestamp() - self.maybe_spawn[message.guild.id]["time"]
-            ) < 5:
-                return
-        self.maybe_spawn[message.guild.id]["amount"] += 1
-        should_spawn = self.spawn_chance(message.guild.id)
-        if not should_spawn:
+        if not self.spawncounters.hit(
+            message.guild.id, message.author.id, self.spawnchance[0], self.spawnchance[1]
+        ):
             return
-        del self.maybe_spawn[message.guild.id]
         if not guildcache["activechannels"]:
             channel = message.channel
         else:
@@ -537,13 +529,7 @@ class Pokecord(
             color=await self.bot.get_embed_color(channel),
         )
         log.debug(f"{pokemon['name']['english']} has spawned in {channel} on {channel.guild}")
-        _file = discord.File(
-            self.datapath
-            + f'/pokemon/{pokemon["name"]["english"] if not pokemon.get("variant") else pokemon.get("alias") if pokemon.get("alias") else pokemon["name"]["english"]}.png'.replace(
-                ":", ""
-            ),
-            filename="pokemonspawn.png",
-        )
+        _file = await self.sprites.file(pokemon)
         embed.set_image(url="attachment://pokemonspawn.png")
         embed.set_footer(
             text=_("Supports: {languages}").format(
@@ -559,63 +545,50 @@ class Pokecord(
             )
         )
         await channel.send(embed=embed, file=_file)
-        await self.config.channel(channel).pokemon.set(pokemon)
+        self.spawns.set(channel.id, species_key(pokemon))
 
     def calc_xp(self, lvl):
         return 25 * lvl
 
     async def exp_gain(self, channel, user):
         # conf = await self.user_is_global(user) # TODO: guild based
-        userconf = self.usercache.get(user.id)
-        if userconf is None:
+        userconf = await self.usercache.load(user.id)
+        if not userconf["has_starter"]:
             return
-        if datetime.datetime.utcnow().timestamp() - userconf["timestamp"] < 10:
+        if self.usercache.cooldown(user.id, time.monotonic(), 10):
             return
-        self.usercache[user.id][
-            "timestamp"
-        ] = datetime.datetime.utcnow().timestamp()  # Try remove a race condition
-        await self.config.user(user).timestamp.set(
-            datetime.datetime.utcnow().timestamp()
-        )  # TODO: guild based
-        await self.update_user_cache()
-        result = await self.cursor.fetch_all(query=SELECT_POKEMON, values={"user_id": user.id})
-        pokemons = []
-        for data in result:
-            pokemons.append([json.loads(data[0]), data[1]])
-        if not pokemons:
-            return
-        index = userconf["pokeid"] - 1
-        pokemon = None
-        if userconf["pokeid"] > len(pokemons):
-            index = 0
-        if pokemons[index][0]["level"] < 100:
-            pokemon = pokemons[index][0]
-            msg_id = pokemons[index][1]
-        else:
-            for i, poke in enumerate(pokemons):
-                if poke[0]["level"] < 100:
-                    pokemon = poke[0]
-                    msg_id = poke[1]
-                    break
-        if pokemon is None:
-            return  # No pokemon available to lvl up
+        entry = self.xpledger.get(user.id)
+        if (
+            entry is None
+            or entry.selected != userconf["selected"]
+            or entry.pokemon["level"] >= 100
+        ):
+            await self.xpledger.evict(user.id)
+            selected = await self.get_selected(user)
+            if selected is None:
+                return
+            message_id, _slot, pokemon = selected
+            if pokemon["level"] >= 100:
+                data = await self.storage.fetch_levelling(user.id)
+                if data is None:
+                    return  # No pokemon available to lvl up
+                message_id, pokemon = data.message_id, data.pokemon
+            entry = self.xpledger.track(user.id, message_id, selected[0], pokemon)
+        pokemon = entry.pokemon
         xp = random.randint(5, 25) + (pokemon["level"] // 2)
         pokemon["xp"] += xp
         embed = None
-        if pokemon["xp"] >= self.calc_xp(pokemon["level"]):
+        levelled = pokemon["xp"] >= self.calc_xp(pokemon["level"])
+        if levelled:
             pokemon["level"] += 1
             pokemon["xp"] = 0
-            if isinstance(pokemon["name"], str):
-                pokename = pokemon["name"]
-            else:
-                pokename = pokemon["name"]["english"]
-            evolve = self.evolvedata.get(pokename)
+            evolve = self.evolutions.get(pokemon)
             name = (
                 self.get_name(pokemon["name"], user)
                 if pokemon.get("nickname") is None
                 else f'"{pokemon.get("nickname")}"'
             )
-            if evolve is not None and (pokemon["level"] >= int(evolve["level"])):
+            if evolve is not None and (pokemon["level"] >= evolve[0]):
                 lvl = pokemon["level"]
                 nick = pokemon.get("nickname")
                 ivs = pokemon["ivs"]
@@ -632,30 +605,7 @@ class Pokecord(
                         "Speed": random.randint(0, 31),
                     }
                 stats = pokemon["stats"]
-                if pokemon.get("variant", None) is not None:
-                    pokemon = next(
-                        (
-                            item
-                            for item in self.pokemondata
-                            if (item["name"]["english"] == evolve["evolution"])
-                            and item.get("variant", "") == pokemon.get("variant", "")
-                        ),
-                        None,
-                    )
-                else:
-                    pokemon = next(
-                        (
-                            item
-                            for item in self.pokemondata
-                            if (item["name"]["english"] == evolve["evolution"])
-                        ),
-                        None,
-                    )  # Make better
-                if pokemon is None:
-                    # log.debug(
-                    #     f"Error occured trying to find {evolve['evolution']} for an evolution."
-                    # )
-                    return
+                pokemon = copy.deepcopy(evolve[1])
                 if nick is not None:
                     pokemon["nickname"] = nick
                 pokemon["xp"] = 0
@@ -672,11 +622,7 @@ class Pokecord(
                         color=await self.bot.get_embed_color(channel),
                     )
                 log.debug(f"{name} has evolved into {pokemon['name']} for {user}.")
-                async with self.config.user(user).pokeids() as poke:
-                    if str(pokemon["id"]) not in poke:
-                        poke[str(pokemon["id"])] = 1
-                    else:
-                        poke[str(pokemon["id"])] += 1
+                entry.evolved.append(pokemon["id"])
             else:
                 log.debug(f"{pokemon['name']} levelled up for {user}")
                 for stat in pokemon["stats"]:
@@ -704,23 +650,29 @@ class Pokecord(
                     channel = None
                 if channel is not None:
                     await channel.send(embed=embed)
-        # data = (user.id, msg_id, json.dumps(pokemon))
-        await self.cursor.execute(
-            query=UPDATE_POKEMON,
-            values={"user_id": user.id, "message_id": msg_id, "pokemon": json.dumps(pokemon)},
-        )
-        # task = functools.partial(self.safe_write, UPDATE_POKEMON, data)
-        # await self.bot.loop.run_in_executor(self._executor, task)
+        entry.pokemon = pokemon
+        self.xpledger.mark_dirty(user.id)
+        if levelled:
+            await self.xpledger.flush(user.id)
 
     @commands.command(hidden=True)
-    async def pokesim(self, ctx, amount: int = 1000000):
-        """Sim pokemon spawning - This is blocking."""
-        a = {}
-        for _ in range(amount):
-            pokemon = self.pokemon_choose()
-            variant = pokemon.get("variant", "Normal")
-            if variant not in a:
-                a[variant] = 1
-            else:
-                a[variant] += 1
-        await ctx.send(a)
+    async def pokesim(self, ctx, amount: int = 1000000, seed: int = None):
+        """Sim pokemon spawning and compare it to the expected spawn rates."""
+        if amount <= 0:
+            return await ctx.send(_("The amount must be greater than 0!"))
+        async with ctx.typing():
+            report = await self.bot.loop.run_in_executor(
+                None, functools.partial(self.spawnsim.run, amount, seed=seed)
+            )
+        msg = ""
+        for group, result in report.items():
+            lst = [
+                [name, count, f"{expected:.4%}", f"{observed:.4%}"]
+                for name, count, expected, observed in result["rows"]
+            ]
+            msg += tabulate.tabulate(lst, headers=[group, "Spawns", "Expected", "Observed"])
+            msg += "\nChi-squared: {chi2:.2f} | Degrees of freedom: {dof} | p: {p:.4f}\n\n".format(
+                **result
+            )
+        for page in pagify(msg, delims=["\n\n"]):
+            await ctx.send(box(page))
@@ -0,0 +1,37 @@
+from typing import Dict, Iterable, List, Tuple
+
+# User locales and the catalog name they show.
+LOCALE_NAMES = {"en": "english", "fr": "french", "tw": "chinese", "jp": "japanese"}
+
+Entry = Tuple[str, str]
+
+
+class Pokedex:
+    """Static pokedex pages, built once per locale.
+
+    A page is a list of (pokemon ID, field title) pairs. Only a user's caught counts are
+    looked up when a page is shown.
+    """
+
+    def __init__(self, pokemons: Iterable[dict], *, per_page: int = 20):
+        self.per_page = per_page
+        # Later entries with the same ID replace earlier ones, as the old pokemonlist did.
+        self._names: Dict[int, dict] = {
+            pokemon["id"]: pokemon["name"] for pokemon in sorted(pokemons, key=lambda x: x["id"])
+        }
+        self._pages: Dict[str, List[List[Entry]]] = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def pages(self, locale: str = "en") -> List[List[Entry]]:
+        pages = self._pages.get(locale)
+        if pages is None:
+            field = LOCALE_NAMES.get(locale, "english")
+            entries = [
+                (str(_id), f"{names.get(field) or names['english']} #{str(_id).zfill(3)}")
+                for _id, names in self._names.items()
+            ]
+            pages = [entries[i : i + self.per_page] for i in range(0, len(entries), self.per_page)]
+            self._pages[locale] = pages
+        return pages
@@ -0,0 +1,79 @@
+import random
+from typing import Generic, List, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+class AliasSampler(Generic[T]):
+    """Weighted sampling in constant time using Vose's alias method.
+
+    The alias table is built once from the items and their weights, each draw then costs a
+    single random index and a coin flip no matter how large the catalog is. Pass a seed to
+    get reproducible draws.
+    """
+
+    def __init__(self, items: Sequence[T], weights: Sequence[float], *, seed=None):
+        self.rng = random.Random(seed)
+        self.rebuild(items, weights)
+
+    def __len__(self):
+        return len(self.items)
+
+    def seed(self, seed=None):
+        self.rng.seed(seed)
+
+    def rebuild(self, items: Sequence[T], weights: Sequence[float]):
+        """Rebuild the alias table, used when the catalog or spawn weights change."""
+        if len(items) != len(weights):
+            raise ValueError("The number of weights does not match the number of items.")
+        total = float(sum(weights))
+        if not items or total <= 0:
+            raise ValueError("At least one item must have a positive weight.")
+        n = len(items)
+        scaled = [weight * n / total for weight in weights]
+        prob = [0.0] * n
+        alias = [0] * n
+        small = [i for i, weight in enumerate(scaled) if weight < 1]
+        large = [i for i, weight in enumerate(scaled) if weight >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            prob[less] = scaled[less]
+            alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+        # Whatever is left is only off from 1 by floating point error.
+        for i in large + small:
+            prob[i] = 1.0
+        self.items = list(items)
+        self.weights = list(weights)
+        self.total = total
+        self._prob = prob
+        self._alias = alias
+
+    def index(self) -> int:
+        i = int(self.rng.random() * len(self._prob))
+        return i if self.rng.random() < self._prob[i] else self._alias[i]
+
+    def choice(self) -> T:
+        return self.items[self.index()]
+
+    def sample(self, k: int) -> List[T]:
+        """Draw k items with replacement."""
+        return [self.items[i] for i in self.indices(k)]
+
+    def indices(self, k: int) -> List[int]:
+        rand = self.rng.random
+        prob, alias = self._prob, self._alias
+        n = len(prob)
+        result = []
+        for _ in range(k):
+            i = int(rand() * n)
+            result.append(i if rand() < prob[i] else alias[i])
+        return result
+
+    def probability(self, i: int) -> float:
+        """The exact chance of drawing the item at an index."""
+        return self.weights[i] / self.total
@@ -0,0 +1,53 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from .statements import SEARCH_CONDITIONS, SEARCH_POKEMON, SEARCH_RANGES, SEARCH_SORTS
+
+_RANGE = re.compile(
+    r"^(?:(?P<low>\d+)\s*\.\.\s*(?P<high>\d+)|(?P<op>[<>]=?|=)?\s*(?P<value>\d+))$"
+)
+
+Bound = Tuple[str, int]
+
+
+def parse_range(text: str) -> Optional[List[Bound]]:
+    """Parse `30`, `30..50`, `>150` or `<=20` into (operator, value) bounds."""
+    match = _RANGE.match(text.strip())
+    if match is None:
+        return None
+    if match["low"] is not None:
+        low, high = sorted((int(match["low"]), int(match["high"])))
+        return [(">=", low), ("<=", high)]
+    return [(match["op"] or "=", int(match["value"]))]
+
+
+def build_search(
+    user_id: int,
+    filters: Dict[str, Any],
+    ranges: Dict[str, List[Bound]],
+    *,
+    sort: str = "slot",
+    descending: bool = False,
+    limit: Optional[int] = None,
+) -> Tuple[str, dict]:
+    """Compile search filters into one query, every filter joined with AND.
+
+    Each filter maps onto an indexed column or a JSON lookup, names are resolved to a list of
+    species IDs beforehand.
+    """
+    conditions = ["user_id = :user_id"]
+    values = {"user_id": user_id}
+    for key, value in filters.items():
+        conditions.append(SEARCH_CONDITIONS[key])
+        values[key] = json.dumps(value) if key == "names" else value
+    for key, bounds in ranges.items():
+        for i, (op, value) in enumerate(bounds):
+            conditions.append(f"{SEARCH_RANGES[key]} {op} :{key}_{i}")
+            values[f"{key}_{i}"] = value
+    order = SEARCH_SORTS[sort] + (" DESC" if descending else "")
+    if sort != "slot":
+        order += ", slot"
+    query = SEARCH_POKEMON.format(conditions=" AND ".join(conditions), order=order)
+    values["limit"] = limit if limit is not None else -1
+    return query, values
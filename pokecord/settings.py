@@ -1,9 +1,13 @@
+import os
+
 import discord
 from redbot.core import commands
 from redbot.core.i18n import Translator
 from redbot.core.utils.chat_formatting import humanize_list
 
 from .abc import MixinMeta
+from .spritepack import SPRITE_SETS
+from .storage import STORAGE_BACKENDS
 
 poke = MixinMeta.poke
 
@@ -38,7 +42,7 @@ class SettingsMixin(MixinMeta):
             await ctx.send(_("Your pokécord levelling messages have been silenced."))
         else:
             await ctx.send(_("Your pokécord levelling messages have been re-enabled!"))
-        await self.update_user_cache()
+        self.usercache.invalidate(ctx.author.id)
 
     @poke.command()
     @commands.guild_only()
@@ -54,7 +58,7 @@ class SettingsMixin(MixinMeta):
         conf = await self.user_is_global(ctx.author)
         await conf.locale.set(LOCALES[locale.lower()])
         await ctx.tick()
-        await self.update_user_cache()
+        self.usercache.invalidate(ctx.author.id)
 
     @poke.group(name="set")
     @commands.admin_or_permissions(manage_channels=True)
@@ -190,3 +194,77 @@ class SettingsMixin(MixinMeta):
             )
         await self.config.spawnloop.set(state)
         await ctx.tick()
+
+    @pokecordset.command()
+    @commands.is_owner()
+    async def spawninterval(self, ctx, seconds: int):
+        """Set roughly how often the random spawn loop spawns in each server.
+
+        Takes effect straight away."""
+        if seconds < 60:
+            return await ctx.send(_("The interval must be at least 60 seconds."))
+        await self.config.spawninterval.set(seconds)
+        self.spawnscheduler.set_interval(seconds)
+        await ctx.tick()
+
+    @pokecordset.command()
+    @commands.is_owner()
+    async def spritecache(self, ctx, megabytes: int, prewarm: bool = None):
+        """Set how many megabytes of sprites are kept in memory.
+
+        Set `prewarm` to load the sprites of the most common spawns when the cog loads."""
+        if megabytes < 0:
+            return await ctx.send(_("The size can't be negative."))
+        await self.config.spritecache.set(megabytes)
+        if prewarm is not None:
+            await self.config.spriteprewarm.set(prewarm)
+        self.sprites.resize(megabytes)
+        await ctx.tick()
+
+    @pokecordset.command()
+    @commands.is_owner()
+    async def spriteset(self, ctx, spriteset: str):
+        """Choose which set of sprites pokemon are shown with.
+
+        `optimised` sprites are smaller and upload faster, they are built with `python util.py sprites`.
+        """
+        spriteset = spriteset.lower()
+        if spriteset not in SPRITE_SETS:
+            return await ctx.send(
+                _("Sprite set must be one of {sets}.").format(
+                    sets=humanize_list(list(SPRITE_SETS))
+                )
+            )
+        if not os.path.isdir(f"{self.datapath}/{SPRITE_SETS[spriteset]}") and not os.path.isfile(
+            f"{self.datapath}/{SPRITE_SETS[spriteset]}.pack"
+        ):
+            await ctx.send(
+                _(
+                    "The {spriteset} sprites haven't been built, the original sprites will be used."
+                ).format(spriteset=spriteset)
+            )
+        await self.config.spriteset.set(spriteset)
+        self.sprites.use(spriteset)
+        await ctx.tick()
+
+    @pokecordset.command()
+    @commands.is_owner()
+    async def storage(self, ctx, backend: str):
+        """Choose how pokemon are stored, takes effect when the cog is reloaded.
+
+        `databases` is the default. `apsw` reads and writes the same database on its own thread.
+        `memory` keeps pokemon in memory only and loses them on reload, it is meant for testing.
+        """
+        backend = backend.lower()
+        if backend not in STORAGE_BACKENDS:
+            return await ctx.send(
+                _("Storage backend must be one of {backends}.").format(
+                    backends=humanize_list(list(STORAGE_BACKENDS))
+                )
+            )
+        await self.config.storage.set(backend)
+        await ctx.send(
+            _("Pokemon will be stored with {backend} once the cog is reloaded.").format(
+                backend=backend
+            )
+        )
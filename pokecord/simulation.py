@@ -0,0 +1,94 @@
+import math
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Each tier's share of all spawns, taken together with the tiers above it.
+RARITY_TIERS = (
+    (0.5, "Common"),
+    (0.8, "Uncommon"),
+    (0.95, "Rare"),
+    (1.0, "Very Rare"),
+)
+
+
+def rarity_thresholds(weights: np.ndarray) -> List[Tuple[float, str]]:
+    """The lowest spawn chance of each tier, derived from the spawn weights.
+
+    Species are ranked from most to least likely and each tier takes them until its share of
+    spawns is reached, so the tiers follow the catalog. Species of equal weight share a tier.
+    """
+    ranked = np.sort(weights)[::-1]
+    cumulative = np.cumsum(ranked) / ranked.sum()
+    thresholds = []
+    for share, tier in RARITY_TIERS[:-1]:
+        index = min(int(np.searchsorted(cumulative, share)), len(ranked) - 1)
+        thresholds.append((float(ranked[index]), tier))
+    thresholds.append((0.0, RARITY_TIERS[-1][1]))
+    return thresholds
+
+
+def rarity(spawnchance: float, thresholds: Sequence[Tuple[float, str]]) -> str:
+    for threshold, tier in thresholds:
+        if spawnchance >= threshold:
+            return tier
+    return thresholds[-1][1]
+
+
+def chi2_pvalue(statistic: float, dof: int) -> float:
+    """Upper tail of the chi-squared distribution, using the Wilson-Hilferty approximation."""
+    if dof <= 0:
+        return 1.0
+    z = ((statistic / dof) ** (1 / 3) - (1 - 2 / (9 * dof))) / math.sqrt(2 / (9 * dof))
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+class SpawnSimulation:
+    """Multinomial simulation of spawns grouped by variant and rarity tier.
+
+    Every spawn is drawn in a single NumPy call, so a million spawns take milliseconds. The
+    simulation is CPU bound and should be run in an executor.
+    """
+
+    def __init__(self, pokemons: Sequence[dict]):
+        self.weights = np.array([pokemon["spawnchance"] for pokemon in pokemons], dtype=float)
+        self.probabilities = self.weights / self.weights.sum()
+        self.thresholds = rarity_thresholds(self.weights)
+        self.groups: Dict[str, Tuple[List[str], np.ndarray]] = {
+            "Variant": self._group([pokemon.get("variant") or "Normal" for pokemon in pokemons]),
+            "Rarity": self._group(
+                [rarity(pokemon["spawnchance"], self.thresholds) for pokemon in pokemons],
+                [tier for _, tier in RARITY_TIERS],
+            ),
+        }
+
+    @staticmethod
+    def _group(labels: List[str], order: Sequence[str] = ()) -> Tuple[List[str], np.ndarray]:
+        names = [name for name in order if name in labels]
+        names += sorted(set(labels) - set(names))
+        index = {name: i for i, name in enumerate(names)}
+        return names, np.array([index[label] for label in labels])
+
+    def run(self, amount: int, *, seed=None) -> Dict[str, dict]:
+        rng = np.random.default_rng(seed)
+        counts = rng.multinomial(amount, self.probabilities)
+        report = {}
+        for group, (names, codes) in self.groups.items():
+            observed = np.bincount(codes, weights=counts, minlength=len(names))
+            expected = np.bincount(codes, weights=self.probabilities, minlength=len(names))
+            expected_counts = expected * amount
+            mask = expected_counts > 0
+            statistic = float(
+                (((observed - expected_counts) ** 2)[mask] / expected_counts[mask]).sum()
+            )
+            dof = int(mask.sum()) - 1
+            report[group] = {
+                "rows": [
+                    (name, int(observed[i]), float(expected[i]), float(observed[i] / amount))
+                    for i, name in enumerate(names)
+                ],
+                "chi2": statistic,
+                "dof": dof,
+                "p": chi2_pvalue(statistic, dof),
+            }
+        return report
@@ -0,0 +1,279 @@
+import asyncio
+import heapq
+import logging
+import random
+import sys
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from redbot.core import Config
+
+from .catalog import species_key
+
+log = logging.getLogger("red.flare.pokecord.spawns")
+
+
+class SpawnCounter:
+    """Messages counted towards a guild's next spawn."""
+
+    __slots__ = ("amount", "threshold", "author", "created", "seen")
+
+    def __init__(self, threshold: int, author: int, now: float):
+        self.amount = 1
+        self.threshold = threshold
+        self.author = author
+        self.created = now
+        self.seen = now
+
+
+class SpawnCounters:
+    """Per guild message counters that decide when a pokemon spawns.
+
+    Counters are kept in least recently active order, so guilds that go quiet for longer
+    than the TTL are dropped from the front as messages come in.
+    """
+
+    def __init__(self, *, ttl: int = 3600, cooldown: int = 5):
+        self.ttl = ttl
+        self.cooldown = cooldown
+        self.expired = 0
+        self._counters: "OrderedDict[int, SpawnCounter]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._counters)
+
+    def _expire(self, now: float):
+        while self._counters:
+            guild_id, counter = next(iter(self._counters.items()))
+            if now - counter.seen < self.ttl:
+                break
+            del self._counters[guild_id]
+            self.expired += 1
+
+    def hit(self, guild_id: int, author_id: int, low: int, high: int) -> bool:
+        """Count a message and return whether the guild should get a spawn."""
+        now = time.monotonic()
+        self._expire(now)
+        counter = self._counters.get(guild_id)
+        if counter is None:
+            counter = SpawnCounter(random.randint(low, high), author_id, now)
+            self._counters[guild_id] = counter
+        else:
+            self._counters.move_to_end(guild_id)
+            counter.seen = now
+        if counter.author == author_id and now - counter.created < self.cooldown:
+            return False  # stop spamming to spawn
+        counter.amount += 1
+        if counter.amount <= counter.threshold:
+            return False
+        del self._counters[guild_id]
+        return True
+
+    def memory(self) -> int:
+        """Approximate bytes used by the counters."""
+        size = sys.getsizeof(self._counters)
+        for guild_id, counter in self._counters.items():
+            size += sys.getsizeof(guild_id) + sys.getsizeof(counter)
+            size += sum(sys.getsizeof(getattr(counter, slot)) for slot in SpawnCounter.__slots__)
+        return size
+
+
+class ChannelSpawns:
+    """The pokemon waiting to be caught in each channel, stored by species key.
+
+    Reads and writes only touch memory. Changes are written to config by a background loop
+    and when the cog unloads, so spawns survive a restart.
+    """
+
+    def __init__(self, config: Config, *, interval: int = 30):
+        self.config = config
+        self.interval = interval
+        self._active: Dict[int, str] = {}
+        self._dirty: Dict[int, Optional[str]] = {}
+
+    def __len__(self):
+        return len(self._active)
+
+    def __contains__(self, channel_id: int) -> bool:
+        return channel_id in self._active
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    async def load(self, species: Dict[str, dict]):
+        """Load persisted spawns, dropping any that are no longer in the catalog."""
+        for channel_id, data in (await self.config.all_channels()).items():
+            pokemon = data.get("pokemon")
+            if pokemon is None:
+                continue
+            # Spawns used to be stored as the whole catalog entry.
+            key = species_key(pokemon) if isinstance(pokemon, dict) else pokemon
+            if key in species:
+                self._active[channel_id] = key
+                if key != pokemon:
+                    self._dirty[channel_id] = key
+            else:
+                self._dirty[channel_id] = None
+
+    def get(self, channel_id: int) -> Optional[str]:
+        return self._active.get(channel_id)
+
+    def set(self, channel_id: int, key: str):
+        self._active[channel_id] = key
+        self._dirty[channel_id] = key
+
+    def claim(self, channel_id: int, key: str) -> bool:
+        """Clear a channel's spawn if it is still `key`, returning whether this call won it.
+
+        There is no await between the check and the clear, so when several catches race for
+        the same spawn exactly one of them gets it.
+        """
+        if self._active.get(channel_id) != key:
+            return False
+        del self._active[channel_id]
+        self._dirty[channel_id] = None
+        return True
+
+    def pop(self, channel_id: int) -> Optional[str]:
+        key = self._active.pop(channel_id, None)
+        if key is not None:
+            self._dirty[channel_id] = None
+        return key
+
+    async def flush(self):
+        dirty, self._dirty = self._dirty, {}
+        while dirty:
+            channel_id, key = next(iter(dirty.items()))
+            try:
+                if key is None:
+                    await self.config.channel_from_id(channel_id).pokemon.clear()
+                else:
+                    await self.config.channel_from_id(channel_id).pokemon.set(key)
+            except Exception:
+                # Keep whatever wasn't written, unless it changed again in the meantime.
+                for channel_id, key in dirty.items():
+                    self._dirty.setdefault(channel_id, key)
+                raise
+            del dirty[channel_id]
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as exc:
+                log.error("Exception saving channel spawns: ", exc_info=exc)
+
+
+class SpawnScheduler:
+    """Heap of per guild random spawn times.
+
+    Each guild is spawned in about once per interval, with jitter so the spawns are spread
+    out instead of arriving in one burst. Spawns are sent with bounded concurrency so a slow
+    channel only holds up its own spawn.
+    """
+
+    def __init__(
+        self,
+        eligible: Callable[[], Iterable[int]],
+        spawn: Callable[[int], Awaitable],
+        *,
+        interval: int = 2400,
+        concurrency: int = 5,
+        jitter: float = 0.25,
+    ):
+        self.eligible = eligible
+        self.spawn = spawn
+        self.interval = interval
+        self.jitter = jitter
+        self.sent = 0
+        self.skipped = 0
+        self.lateness: Deque[float] = deque(maxlen=100)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._heap: List[Tuple[float, int]] = []
+        self._scheduled: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._wake = asyncio.Event()
+        self._stale = True
+
+    @property
+    def pending(self) -> int:
+        return len(self._heap)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def next_due(self) -> Optional[float]:
+        return self._heap[0][0] - time.monotonic() if self._heap else None
+
+    def refresh(self):
+        """Pick up guilds that were enabled or disabled."""
+        self._stale = True
+        self._wake.set()
+
+    def set_interval(self, interval: int):
+        """Change the interval, rescaling the spawns that are already scheduled."""
+        now = time.monotonic()
+        scale = interval / self.interval
+        self._heap = [(now + max(due - now, 0) * scale, guild_id) for due, guild_id in self._heap]
+        heapq.heapify(self._heap)
+        self.interval = interval
+        self._wake.set()
+
+    def _delay(self) -> float:
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _sync(self, now: float):
+        eligible = set(self.eligible())
+        for guild_id in eligible - self._scheduled:
+            # Spread new guilds over the first interval.
+            heapq.heappush(self._heap, (now + self.interval * random.random(), guild_id))
+        self._scheduled |= eligible
+        self._stale = False
+
+    async def _send(self, guild_id: int, due: float):
+        async with self._semaphore:
+            # Measured once a slot is free, so waiting on the concurrency bound counts too.
+            self.lateness.append(time.monotonic() - due)
+            try:
+                await self.spawn(guild_id)
+            except Exception as exc:
+                log.error("Exception in pokemon auto spawning: ", exc_info=exc)
+
+    def _start(self, guild_id: int, due: float):
+        task = asyncio.get_running_loop().create_task(self._send(guild_id, due))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def run(self):
+        try:
+            while True:
+                now = time.monotonic()
+                if self._stale:
+                    self._sync(now)
+                eligible = None
+                while self._heap and self._heap[0][0] <= now:
+                    due, guild_id = heapq.heappop(self._heap)
+                    if eligible is None:
+                        eligible = set(self.eligible())
+                    if guild_id not in eligible:
+                        self._scheduled.discard(guild_id)
+                        continue
+                    heapq.heappush(self._heap, (due + self._delay(), guild_id))
+                    if random.randint(1, 2) == 2:
+                        self.skipped += 1
+                        continue
+                    self.sent += 1
+                    self._start(guild_id, due)
+                timeout = self._heap[0][0] - now if self._heap else self.interval
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in self._tasks:
+                task.cancel()
@@ -0,0 +1,127 @@
+import io
+import json
+import mmap
+import struct
+from typing import Dict, Iterable, Optional, Tuple
+
+# Sprite sets and the folder under the data path they are read from. The optimised set is
+# built with `python util.py sprites`, packs with `python util.py pack <set>`.
+SPRITE_SETS = {"original": "pokemon", "optimised": "pokemon_optimised"}
+PACK_MAGIC = b"PKSP"
+PACK_FORMAT = 1
+# Magic, format and the length of the JSON index that follows the header.
+_HEADER = struct.Struct("<4sII")
+
+
+class SpriteReader(io.RawIOBase):
+    """Read-only file object over a slice of the pack, so uploads don't copy the sprite."""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, min(offset, len(self._view)))
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        data = self._view[self._pos : self._pos + len(buffer)]
+        size = len(data)
+        buffer[:size] = data
+        self._pos += size
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+class SpritePack:
+    """Every sprite of a set in one memory-mapped file, indexed by species key."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, length = _HEADER.unpack_from(self._mmap)
+            if magic != PACK_MAGIC or version != PACK_FORMAT:
+                raise ValueError(f"{path} is not a sprite pack this version can read.")
+            start = _HEADER.size
+            self.index: Dict[str, Tuple[int, int]] = {
+                key: tuple(value)
+                for key, value in json.loads(self._mmap[start : start + length]).items()
+            }
+        except Exception:
+            self._file.close()
+            raise
+        self._view = memoryview(self._mmap)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    @property
+    def size(self) -> int:
+        return len(self._mmap)
+
+    def get(self, key: str) -> Optional[memoryview]:
+        location = self.index.get(key)
+        if location is None:
+            return None
+        offset, length = location
+        return self._view[offset : offset + length]
+
+    def reader(self, key: str) -> Optional[SpriteReader]:
+        view = self.get(key)
+        return SpriteReader(view) if view is not None else None
+
+    def close(self):
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # A sprite is still being uploaded, the map is freed once it's done.
+        self._file.close()
+
+
+def build_pack(sprites: Iterable[Tuple[str, str]], path: str) -> Dict[str, Tuple[int, int]]:
+    """Write a pack from (species key, file path) pairs. Missing files are skipped."""
+    blobs = []
+    for key, filename in sprites:
+        try:
+            with open(filename, "rb") as f:
+                blobs.append((key, f.read()))
+        except FileNotFoundError:
+            continue
+    # Offsets depend on the index length, so size the index with placeholder offsets first.
+    index = {key: [0, len(data)] for key, data in blobs}
+    placeholder = json.dumps({key: [2**40, length] for key, (_, length) in index.items()})
+    offset = _HEADER.size + len(placeholder.encode())
+    for key, data in blobs:
+        index[key][0] = offset
+        offset += len(data)
+    encoded = json.dumps(index).encode()
+    encoded += b" " * (len(placeholder.encode()) - len(encoded))
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(PACK_MAGIC, PACK_FORMAT, len(encoded)))
+        f.write(encoded)
+        for _, data in blobs:
+            f.write(data)
+    return {key: tuple(value) for key, value in index.items()}
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from io import BytesIO
+from typing import Iterable, Optional
+
+import discord
+
+from .catalog import species_key
+from .spritepack import SPRITE_SETS, SpritePack
+
+log = logging.getLogger("red.flare.pokecord.sprites")
+
+
+def sprite_name(pokemon: dict) -> str:
+    return species_key(pokemon).replace(":", "")
+
+
+class SpriteCache:
+    """LRU cache of sprite bytes, bounded by their total size in megabytes.
+
+    Files are read in an executor so a cold read never blocks the event loop. Sprites missing
+    from the chosen set are read from the original set. When the set has been packed, sprites
+    are served straight from the memory-mapped pack and the loose files are only a fallback.
+    """
+
+    def __init__(self, path: str, *, maxsize: int = 32, spriteset: str = "original"):
+        self.path = path
+        self.spriteset = spriteset
+        self.maxsize = maxsize * 1024 * 1024
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.packed = 0
+        self.pack: Optional[SpritePack] = None
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._data
+
+    def resize(self, maxsize: int):
+        self.maxsize = maxsize * 1024 * 1024
+        self._shrink()
+
+    def use(self, spriteset: str):
+        if spriteset not in SPRITE_SETS:
+            raise KeyError(spriteset)
+        if spriteset != self.spriteset:
+            self.spriteset = spriteset
+            self.clear()
+            self.close()
+        if self.pack is None:
+            self.open_pack()
+
+    def open_pack(self):
+        path = f"{self.path}/{SPRITE_SETS[self.spriteset]}.pack"
+        if not os.path.isfile(path):
+            return
+        try:
+            self.pack = SpritePack(path)
+        except (OSError, ValueError) as exc:
+            log.warning(f"Unable to open the sprite pack, using loose files: {exc}")
+        else:
+            log.debug(f"Mapped {len(self.pack)} sprites from {path}.")
+
+    def close(self):
+        if self.pack is not None:
+            self.pack.close()
+            self.pack = None
+
+    def clear(self):
+        self._data.clear()
+        self.size = 0
+
+    def _shrink(self):
+        while self.size > self.maxsize and self._data:
+            _, data = self._data.popitem(last=False)
+            self.size -= len(data)
+
+    def _read(self, name: str) -> bytes:
+        try:
+            with open(f"{self.path}/{SPRITE_SETS[self.spriteset]}/{name}.png", "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            if self.spriteset == "original":
+                raise
+        with open(f"{self.path}/{SPRITE_SETS['original']}/{name}.png", "rb") as f:
+            return f.read()
+
+    def _store(self, name: str, data: bytes):
+        if len(data) > self.maxsize:
+            return
+        self._data[name] = data
+        self.size += len(data)
+        self._shrink()
+
+    async def get(self, pokemon: dict) -> bytes:
+        name = sprite_name(pokemon)
+        data = self._data.get(name)
+        if data is not None:
+            self.hits += 1
+            self._data.move_to_end(name)
+            return data
+        self.misses += 1
+        data = await asyncio.get_running_loop().run_in_executor(None, self._read, name)
+        if name not in self._data:
+            self._store(name, data)
+        return data
+
+    async def file(self, pokemon: dict, *, filename: str = "pokemonspawn.png") -> discord.File:
+        if self.pack is not None:
+            reader = self.pack.reader(species_key(pokemon))
+            if reader is not None:
+                self.packed += 1
+                return discord.File(reader, filename=filename)
+        return discord.File(BytesIO(await self.get(pokemon)), filename=filename)
+
+    async def prewarm(self, pokemons: Iterable[dict]):
+        """Load the sprites of the most likely spawns until the cache is full."""
+        if self.pack is not None:
+            return
+        loop = asyncio.get_running_loop()
+        loaded = 0
+        for pokemon in sorted(pokemons, key=lambda x: x["spawnchance"], reverse=True):
+            name = sprite_name(pokemon)
+            if name in self._data:
+                continue
+            try:
+                data = await loop.run_in_executor(None, self._read, name)
+            except FileNotFoundError:
+                continue
+            if self.size + len(data) > self.maxsize:
+                break
+            self._store(name, data)
+            loaded += 1
+        log.debug(f"Prewarmed {loaded} sprites, {self.size / 1024 / 1024:.1f}MB cached.")
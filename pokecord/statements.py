@@ -3,9 +3,46 @@ CREATE TABLE IF NOT EXISTS users (
     user_id INTEGER NOT NULL,
     message_id INTEGER NOT NULL UNIQUE,
     pokemon JSON,
+    species_id INTEGER,
+    variant TEXT,
+    level INTEGER,
+    xp INTEGER,
+    gender TEXT,
+    iv_total INTEGER,
+    nickname TEXT,
+    slot INTEGER,
+    version INTEGER NOT NULL DEFAULT 0,
     PRIMARY KEY (user_id, message_id)
     );
 """
+# Columns added to the original (user_id, message_id, pokemon) table, mirrored from the JSON.
+POKEMON_COLUMNS = {
+    "species_id": "INTEGER",
+    "variant": "TEXT",
+    "level": "INTEGER",
+    "xp": "INTEGER",
+    "gender": "TEXT",
+    "iv_total": "INTEGER",
+    "nickname": "TEXT",
+    "slot": "INTEGER",
+    "version": "INTEGER NOT NULL DEFAULT 0",
+}
+POKECORD_CREATE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS users_species_idx ON users (user_id, species_id);",
+    "CREATE INDEX IF NOT EXISTS users_variant_idx ON users (user_id, variant);",
+    "CREATE INDEX IF NOT EXISTS users_level_idx ON users (user_id, level);",
+    "CREATE INDEX IF NOT EXISTS users_gender_idx ON users (user_id, gender);",
+    "CREATE INDEX IF NOT EXISTS users_iv_total_idx ON users (user_id, iv_total);",
+    "CREATE INDEX IF NOT EXISTS users_slot_idx ON users (user_id, slot);",
+]
+POKECORD_CREATE_POKEDEX_TABLE = """
+CREATE TABLE IF NOT EXISTS pokedex (
+    user_id INTEGER NOT NULL,
+    species_id INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    PRIMARY KEY (user_id, species_id)
+    ) WITHOUT ROWID;
+"""
 PRAGMA_journal_mode = """
 PRAGMA journal_mode = wal;
 """
@@ -15,18 +52,173 @@ PRAGMA wal_autocheckpoint;
 PRAGMA_read_uncommitted = """
 PRAGMA read_uncommitted = 1;
 """
+PRAGMA_table_info = """
+PRAGMA table_info(users);
+"""
 
 INSERT_POKEMON = """
-INSERT INTO users (user_id, message_id, pokemon)
-VALUES (:user_id, :message_id, :pokemon);
+INSERT INTO users (
+    user_id, message_id, pokemon, species_id, variant, level, xp, gender, iv_total, nickname,
+    slot
+)
+VALUES (
+    :user_id, :message_id, :pokemon, :species_id, :variant, :level, :xp, :gender, :iv_total,
+    :nickname, (SELECT COALESCE(MAX(slot), 0) + 1 FROM users WHERE user_id = :user_id)
+);
 """
 
+# Every pokemon select returns these columns, in this order.
 SELECT_POKEMON = """
-SELECT pokemon, message_id from users where user_id = :user_id
+SELECT pokemon, user_id, message_id, slot, version from users
+where user_id = :user_id ORDER BY slot
+"""
+
+SELECT_POKEMON_SLOT = """
+SELECT pokemon, user_id, message_id, slot, version from users
+where user_id = :user_id and slot = :slot
+"""
+
+SELECT_POKEMON_SLOTS = """
+SELECT pokemon, user_id, message_id, slot, version from users
+where user_id = :user_id and slot BETWEEN :start AND :end
+ORDER BY slot
+"""
+
+SELECT_LEVELLING_POKEMON = """
+SELECT pokemon, user_id, message_id, slot, version from users
+where user_id = :user_id and level < 100
+ORDER BY slot LIMIT 1
+"""
+
+SELECT_POKEMON_BY_ID = """
+SELECT pokemon, user_id, message_id, slot, version from users where message_id = :message_id
+"""
+
+SELECT_POKEDEX = """
+SELECT species_id, amount from pokedex where user_id = :user_id
+"""
+
+SELECT_POKEDEX_AMOUNT = """
+SELECT amount from pokedex where user_id = :user_id and species_id = :species_id
+"""
+
+INCREMENT_POKEDEX = """
+INSERT INTO pokedex (user_id, species_id, amount)
+VALUES (:user_id, :species_id, 1)
+ON CONFLICT (user_id, species_id) DO UPDATE SET amount = amount + 1;
+"""
+
+INSERT_POKEDEX = """
+INSERT INTO pokedex (user_id, species_id, amount)
+VALUES (:user_id, :species_id, :amount)
+ON CONFLICT (user_id, species_id) DO NOTHING;
+"""
+
+COUNT_POKEMON = """
+SELECT COUNT(*) from users where user_id = :user_id
+"""
+
+DELETE_POKEMON = """
+DELETE FROM users where message_id = :message_id
+"""
+
+# Closes the gap left in a user's slots after one of their pokemon is removed.
+SHIFT_SLOTS = """
+UPDATE users
+SET slot = slot - 1
+where user_id = :user_id and slot > :slot;
 """
 
 UPDATE_POKEMON = """
 UPDATE users
-SET pokemon = :pokemon
+SET pokemon = :pokemon, species_id = :species_id, variant = :variant, level = :level,
+    xp = :xp, gender = :gender, iv_total = :iv_total, nickname = :nickname,
+    version = version + 1
 where message_id = :message_id and user_id = :user_id;
 """
+
+POKECORD_CREATE_MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS migrations (
+    version INTEGER PRIMARY KEY,
+    checkpoint INTEGER NOT NULL,
+    migrated INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+SELECT_MIGRATION = """
+SELECT checkpoint, migrated from migrations where version = :version
+"""
+
+SAVE_MIGRATION = """
+INSERT INTO migrations (version, checkpoint, migrated)
+VALUES (:version, :checkpoint, :migrated)
+ON CONFLICT (version) DO UPDATE SET checkpoint = excluded.checkpoint, migrated = excluded.migrated;
+"""
+
+DELETE_MIGRATION = """
+DELETE FROM migrations where version = :version
+"""
+
+SELECT_POKEMON_AFTER = """
+SELECT rowid, pokemon, message_id, user_id from users
+where rowid > :after ORDER BY rowid LIMIT :limit
+"""
+
+COUNT_POKEMON_AFTER = """
+SELECT COUNT(*) from users where rowid > :after
+"""
+
+SELECT_UNMIGRATED_POKEMON = """
+SELECT rowid, pokemon, message_id, user_id from users
+where species_id IS NULL AND rowid > :after ORDER BY rowid LIMIT :limit
+"""
+
+COUNT_UNMIGRATED_POKEMON = """
+SELECT COUNT(*) from users where species_id IS NULL AND rowid > :after
+"""
+
+SELECT_UNSLOTTED_USERS = """
+SELECT DISTINCT user_id from users
+where slot IS NULL AND user_id > :after ORDER BY user_id LIMIT :limit
+"""
+
+COUNT_UNSLOTTED_USERS = """
+SELECT COUNT(DISTINCT user_id) from users where slot IS NULL AND user_id > :after
+"""
+
+SELECT_MESSAGE_IDS = """
+SELECT message_id from users where user_id = :user_id ORDER BY message_id
+"""
+
+RECOUNT_POKEDEX = """
+INSERT INTO pokedex (user_id, species_id, amount)
+SELECT user_id, species_id, COUNT(*) from users where true GROUP BY user_id, species_id
+ON CONFLICT (user_id, species_id) DO UPDATE SET amount = excluded.amount;
+"""
+
+UPDATE_SLOT = """
+UPDATE users
+SET slot = :slot
+where message_id = :message_id;
+"""
+
+SEARCH_POKEMON = """
+SELECT
+    CASE json_type(pokemon, '$.name')
+        WHEN 'object' THEN json_extract(pokemon, '$.name')
+        ELSE json_quote(json_extract(pokemon, '$.name'))
+    END,
+    level, species_id, slot
+FROM users where {conditions} ORDER BY {order} LIMIT :limit
+"""
+SEARCH_CONDITIONS = {
+    "names": "species_id IN (SELECT value FROM json_each(:names))",
+    "variant": "lower(COALESCE(variant, 'None')) = :variant",
+    "gender": "COALESCE(gender, 'no') = :gender",
+    "type": (
+        "EXISTS (SELECT 1 FROM json_each(pokemon, '$.type') WHERE lower(json_each.value) = :type)"
+    ),
+}
+# Columns that can be searched by a range, and the ones search results can be sorted by.
+SEARCH_RANGES = {"level": "level", "id": "species_id", "iv": "iv_total"}
+SEARCH_SORTS = {"slot": "slot", "level": "level", "id": "species_id", "iv": "iv_total"}
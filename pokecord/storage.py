@@ -0,0 +1,575 @@
+import asyncio
+import concurrent.futures
+import json
+import operator
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import apsw
+from databases import Database
+
+from .connections import ReadPool, WriteQueue
+from .functions import pokemon_row
+from .search import Bound, build_search
+from .statements import (
+    COUNT_POKEMON,
+    DELETE_POKEMON,
+    INCREMENT_POKEDEX,
+    INSERT_POKEMON,
+    SEARCH_RANGES,
+    SEARCH_SORTS,
+    SELECT_LEVELLING_POKEMON,
+    SELECT_POKEDEX,
+    SELECT_POKEDEX_AMOUNT,
+    SELECT_POKEMON,
+    SELECT_POKEMON_BY_ID,
+    SELECT_POKEMON_SLOT,
+    SELECT_POKEMON_SLOTS,
+    SHIFT_SLOTS,
+    UPDATE_POKEMON,
+    PRAGMA_journal_mode,
+)
+
+STORAGE_BACKENDS = ("databases", "apsw", "memory")
+
+# (user ID, message ID, pokemon) of a pokemon being written.
+Write = Tuple[int, int, dict]
+# The decoded name, level, species ID and slot of a search result.
+SearchResult = Tuple[Any, int, int, int]
+
+
+class StoredPokemon(NamedTuple):
+    pokemon: dict
+    user_id: int
+    message_id: int
+    slot: int
+    version: int
+
+
+def stored(row) -> StoredPokemon:
+    """Decode a row selected with the pokemon select columns."""
+    return StoredPokemon(json.loads(row[0]), row[1], row[2], row[3], row[4])
+
+
+class Storage(ABC):
+    """The operations the cog performs on stored pokemon and pokedex counts.
+
+    Backends are chosen with `[p]pokecordset storage` and all keep to this API, so the rest of
+    the cog never sees which one is in use.
+    """
+
+    name: str
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    @abstractmethod
+    async def insert(
+        self, user_id: int, message_id: int, pokemon: dict, *, pokedex: bool = False
+    ) -> bool:
+        """Add a pokemon in the user's next slot.
+
+        With `pokedex`, its species is also counted in the user's pokedex and the return value
+        is whether this was the first of its species they caught."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def fetch_collection(
+        self, user_id: int, start: int = 1, end: Optional[int] = None
+    ) -> List[StoredPokemon]:
+        """A user's pokemon from slot `start` to `end` inclusive, in slot order."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def fetch_one(self, user_id: int, slot: int) -> Optional[StoredPokemon]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def fetch_by_id(self, message_id: int) -> Optional[StoredPokemon]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def fetch_levelling(self, user_id: int) -> Optional[StoredPokemon]:
+        """A user's first pokemon below level 100."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update(self, pokemon: List[Write], *, pokedex: Iterable[Tuple[int, int]] = ()):
+        """Write back changed pokemon, counting (user ID, species ID) pairs in the pokedex."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete(self, message_id: int) -> bool:
+        """Delete a pokemon and move its owner's later pokemon down a slot.
+
+        Returns False if the pokemon no longer exists."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def transfer(self, message_id: int, user_id: int, new_message_id: int) -> bool:
+        """Move a pokemon to the end of another user's slots.
+
+        Returns False if the pokemon no longer exists."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def count(self, user_id: int) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def pokedex(self, user_id: int) -> Dict[int, int]:
+        """Caught counts by species ID."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def search(
+        self,
+        user_id: int,
+        filters: Dict[str, Any],
+        ranges: Dict[str, List[Bound]],
+        *,
+        sort: str = "slot",
+        descending: bool = False,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[SearchResult]:
+        """Filtered pokemon, see `build_search` for the filters."""
+        raise NotImplementedError
+
+
+def _pokedex_values(pokedex: Iterable[Tuple[int, int]]) -> List[dict]:
+    return [{"user_id": user_id, "species_id": species_id} for user_id, species_id in pokedex]
+
+
+def _range(user_id: int, start: int, end: Optional[int]) -> Tuple[str, dict]:
+    if end is None and start <= 1:
+        return SELECT_POKEMON, {"user_id": user_id}
+    return SELECT_POKEMON_SLOTS, {"user_id": user_id, "start": start, "end": end or 2**62}
+
+
+class DatabasesStorage(Storage):
+    """pokemon.db through `databases`, writes going through the group commit queue and reads
+    through the read pool."""
+
+    name = "databases"
+
+    def __init__(self, database: Database, url: str):
+        self.writer = WriteQueue(database)
+        self.readers = ReadPool(url)
+        self._task: Optional[asyncio.Task] = None
+
+    async def connect(self):
+        await self.readers.connect()
+        self._task = asyncio.get_running_loop().create_task(self.writer.run())
+
+    async def close(self):
+        await self.writer.close()
+        if self._task is not None:
+            await self._task
+        await self.readers.disconnect()
+
+    def stats(self) -> Dict[str, Any]:
+        writer = self.writer
+        return {
+            "Groups": writer.groups,
+            "Writes": writer.units,
+            "Average group": f"{writer.units / writer.groups if writer.groups else 0:.1f}",
+            "Largest group": writer.largest,
+            "Queued": writer.pending,
+            "Readers busy": f"{self.readers.busy}/{self.readers.size}",
+        }
+
+    async def insert(
+        self, user_id: int, message_id: int, pokemon: dict, *, pokedex: bool = False
+    ) -> bool:
+        row = pokemon_row(user_id, message_id, pokemon)
+        values = {"user_id": user_id, "species_id": row["species_id"]}
+
+        async def insert(db):
+            first = False
+            if pokedex:
+                first = await db.fetch_val(query=SELECT_POKEDEX_AMOUNT, values=values) is None
+                await db.execute(query=INCREMENT_POKEDEX, values=values)
+            await db.execute(query=INSERT_POKEMON, values=row)
+            return first
+
+        return await self.writer.submit(insert)
+
+    async def fetch_collection(
+        self, user_id: int, start: int = 1, end: Optional[int] = None
+    ) -> List[StoredPokemon]:
+        query, values = _range(user_id, start, end)
+        return [stored(row) for row in await self.readers.fetch_all(query=query, values=values)]
+
+    async def _fetch(self, query: str, values: dict) -> Optional[StoredPokemon]:
+        row = await self.readers.fetch_one(query=query, values=values)
+        return stored(row) if row is not None else None
+
+    async def fetch_one(self, user_id: int, slot: int) -> Optional[StoredPokemon]:
+        return await self._fetch(SELECT_POKEMON_SLOT, {"user_id": user_id, "slot": slot})
+
+    async def fetch_by_id(self, message_id: int) -> Optional[StoredPokemon]:
+        return await self._fetch(SELECT_POKEMON_BY_ID, {"message_id": message_id})
+
+    async def fetch_levelling(self, user_id: int) -> Optional[StoredPokemon]:
+        return await self._fetch(SELECT_LEVELLING_POKEMON, {"user_id": user_id})
+
+    async def update(self, pokemon: List[Write], *, pokedex: Iterable[Tuple[int, int]] = ()):
+        values = [pokemon_row(*write) for write in pokemon]
+        pokedex = _pokedex_values(pokedex)
+
+        async def update(db):
+            await db.execute_many(query=UPDATE_POKEMON, values=values)
+            if pokedex:
+                await db.execute_many(query=INCREMENT_POKEDEX, values=pokedex)
+
+        await self.writer.submit(update)
+
+    async def delete(self, message_id: int) -> bool:
+        async def delete(db):
+            data = await db.fetch_one(
+                query=SELECT_POKEMON_BY_ID, values={"message_id": message_id}
+            )
+            if data is None:
+                return False
+            await db.execute(query=DELETE_POKEMON, values={"message_id": message_id})
+            await db.execute(query=SHIFT_SLOTS, values={"user_id": data[1], "slot": data[3]})
+            return True
+
+        return await self.writer.submit(delete)
+
+    async def transfer(self, message_id: int, user_id: int, new_message_id: int) -> bool:
+        async def transfer(db):
+            data = await db.fetch_one(
+                query=SELECT_POKEMON_BY_ID, values={"message_id": message_id}
+            )
+            if data is None:
+                return False
+            await db.execute(query=DELETE_POKEMON, values={"message_id": message_id})
+            await db.execute(query=SHIFT_SLOTS, values={"user_id": data[1], "slot": data[3]})
+            await db.execute(
+                query=INSERT_POKEMON,
+                values=pokemon_row(user_id, new_message_id, json.loads(data[0])),
+            )
+            return True
+
+        return await self.writer.submit(transfer)
+
+    async def count(self, user_id: int) -> int:
+        return await self.readers.fetch_val(query=COUNT_POKEMON, values={"user_id": user_id})
+
+    async def pokedex(self, user_id: int) -> Dict[int, int]:
+        result = await self.readers.fetch_all(query=SELECT_POKEDEX, values={"user_id": user_id})
+        return {data[0]: data[1] for data in result}
+
+    async def search(self, user_id, filters, ranges, *, sort="slot", descending=False, limit=None):
+        query, values = build_search(
+            user_id, filters, ranges, sort=sort, descending=descending, limit=limit
+        )
+        async for data in self.readers.iterate(query=query, values=values):
+            yield json.loads(data[0]), data[1], data[2], data[3]
+
+
+class APSWStorage(Storage):
+    """pokemon.db through apsw on the cog's executor thread.
+
+    Each operation is one call into the executor, its queries run back to back on the thread
+    instead of each being awaited on the event loop.
+    """
+
+    name = "apsw"
+
+    def __init__(self, path: str, executor: concurrent.futures.Executor):
+        self.path = path
+        self.executor = executor
+        self.calls = 0
+        self._connection: Optional[apsw.Connection] = None
+
+    async def _run(self, func, *args):
+        self.calls += 1
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def _open(self) -> apsw.Connection:
+        connection = apsw.Connection(self.path)
+        connection.setbusytimeout(5000)
+        connection.cursor().execute(PRAGMA_journal_mode)
+        return connection
+
+    async def connect(self):
+        self._connection = await self._run(self._open)
+
+    async def close(self):
+        if self._connection is not None:
+            await self._run(self._connection.close)
+            self._connection = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"Path": self.path, "Calls": self.calls}
+
+    def _fetch_all(self, query: str, values: dict) -> list:
+        return self._connection.cursor().execute(query, values).fetchall()
+
+    def _fetch_one(self, query: str, values: dict):
+        return self._connection.cursor().execute(query, values).fetchone()
+
+    async def insert(
+        self, user_id: int, message_id: int, pokemon: dict, *, pokedex: bool = False
+    ) -> bool:
+        row = pokemon_row(user_id, message_id, pokemon)
+        values = {"user_id": user_id, "species_id": row["species_id"]}
+
+        def insert():
+            with self._connection:
+                cursor = self._connection.cursor()
+                first = False
+                if pokedex:
+                    first = cursor.execute(SELECT_POKEDEX_AMOUNT, values).fetchone() is None
+                    cursor.execute(INCREMENT_POKEDEX, values)
+                cursor.execute(INSERT_POKEMON, row)
+                return first
+
+        return await self._run(insert)
+
+    async def fetch_collection(
+        self, user_id: int, start: int = 1, end: Optional[int] = None
+    ) -> List[StoredPokemon]:
+        query, values = _range(user_id, start, end)
+        return [stored(row) for row in await self._run(self._fetch_all, query, values)]
+
+    async def _fetch(self, query: str, values: dict) -> Optional[StoredPokemon]:
+        row = await self._run(self._fetch_one, query, values)
+        return stored(row) if row is not None else None
+
+    async def fetch_one(self, user_id: int, slot: int) -> Optional[StoredPokemon]:
+        return await self._fetch(SELECT_POKEMON_SLOT, {"user_id": user_id, "slot": slot})
+
+    async def fetch_by_id(self, message_id: int) -> Optional[StoredPokemon]:
+        return await self._fetch(SELECT_POKEMON_BY_ID, {"message_id": message_id})
+
+    async def fetch_levelling(self, user_id: int) -> Optional[StoredPokemon]:
+        return await self._fetch(SELECT_LEVELLING_POKEMON, {"user_id": user_id})
+
+    async def update(self, pokemon: List[Write], *, pokedex: Iterable[Tuple[int, int]] = ()):
+        values = [pokemon_row(*write) for write in pokemon]
+        pokedex = _pokedex_values(pokedex)
+
+        def update():
+            with self._connection:
+                cursor = self._connection.cursor()
+                cursor.executemany(UPDATE_POKEMON, values)
+                if pokedex:
+                    cursor.executemany(INCREMENT_POKEDEX, pokedex)
+
+        await self._run(update)
+
+    def _remove(self, cursor: apsw.Cursor, message_id: int) -> Optional[str]:
+        data = cursor.execute(SELECT_POKEMON_BY_ID, {"message_id": message_id}).fetchone()
+        if data is None:
+            return None
+        cursor.execute(DELETE_POKEMON, {"message_id": message_id})
+        cursor.execute(SHIFT_SLOTS, {"user_id": data[1], "slot": data[3]})
+        return data[0]
+
+    async def delete(self, message_id: int) -> bool:
+        def delete():
+            with self._connection:
+                return self._remove(self._connection.cursor(), message_id) is not None
+
+        return await self._run(delete)
+
+    async def transfer(self, message_id: int, user_id: int, new_message_id: int) -> bool:
+        def transfer():
+            with self._connection:
+                cursor = self._connection.cursor()
+                pokemon = self._remove(cursor, message_id)
+                if pokemon is None:
+                    return False
+                cursor.execute(
+                    INSERT_POKEMON, pokemon_row(user_id, new_message_id, json.loads(pokemon))
+                )
+                return True
+
+        return await self._run(transfer)
+
+    async def count(self, user_id: int) -> int:
+        return (await self._run(self._fetch_one, COUNT_POKEMON, {"user_id": user_id}))[0]
+
+    async def pokedex(self, user_id: int) -> Dict[int, int]:
+        result = await self._run(self._fetch_all, SELECT_POKEDEX, {"user_id": user_id})
+        return {data[0]: data[1] for data in result}
+
+    async def search(self, user_id, filters, ranges, *, sort="slot", descending=False, limit=None):
+        query, values = build_search(
+            user_id, filters, ranges, sort=sort, descending=descending, limit=limit
+        )
+        for data in await self._run(self._fetch_all, query, values):
+            yield json.loads(data[0]), data[1], data[2], data[3]
+
+
+_OPERATORS = {
+    "=": operator.eq,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+class MemoryStorage(Storage):
+    """Pokemon kept in dictionaries, for tests and benchmarks. Nothing is persisted.
+
+    Rows hold the same values the SQL backends store, so filtering and versions behave the
+    same way.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self._rows: Dict[int, dict] = {}
+        # Each user's message IDs in slot order, so a pokemon's slot is its position plus one.
+        self._slots: Dict[int, List[int]] = {}
+        self._pokedex: Dict[int, Dict[int, int]] = {}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"Pokemon": len(self._rows), "Users": len(self._slots)}
+
+    def _stored(self, row: dict, slot: int) -> StoredPokemon:
+        return StoredPokemon(
+            json.loads(row["pokemon"]), row["user_id"], row["message_id"], slot, row["version"]
+        )
+
+    def _add(self, row: dict):
+        if row["message_id"] in self._rows:
+            raise ValueError(f"Pokemon {row['message_id']} already exists.")
+        row["version"] = 0
+        self._rows[row["message_id"]] = row
+        self._slots.setdefault(row["user_id"], []).append(row["message_id"])
+
+    def _count(self, user_id: int, species_id: int):
+        pokedex = self._pokedex.setdefault(user_id, {})
+        pokedex[species_id] = pokedex.get(species_id, 0) + 1
+
+    async def insert(
+        self, user_id: int, message_id: int, pokemon: dict, *, pokedex: bool = False
+    ) -> bool:
+        row = pokemon_row(user_id, message_id, pokemon)
+        self._add(row)
+        if not pokedex:
+            return False
+        first = row["species_id"] not in self._pokedex.get(user_id, {})
+        self._count(user_id, row["species_id"])
+        return first
+
+    async def fetch_collection(
+        self, user_id: int, start: int = 1, end: Optional[int] = None
+    ) -> List[StoredPokemon]:
+        slots = self._slots.get(user_id, [])
+        start = max(start, 1)
+        return [
+            self._stored(self._rows[message_id], slot)
+            for slot, message_id in enumerate(slots[start - 1 : end], start=start)
+        ]
+
+    async def fetch_one(self, user_id: int, slot: int) -> Optional[StoredPokemon]:
+        slots = self._slots.get(user_id, [])
+        if not 1 <= slot <= len(slots):
+            return None
+        return self._stored(self._rows[slots[slot - 1]], slot)
+
+    async def fetch_by_id(self, message_id: int) -> Optional[StoredPokemon]:
+        row = self._rows.get(message_id)
+        if row is None:
+            return None
+        return self._stored(row, self._slots[row["user_id"]].index(message_id) + 1)
+
+    async def fetch_levelling(self, user_id: int) -> Optional[StoredPokemon]:
+        for slot, message_id in enumerate(self._slots.get(user_id, []), start=1):
+            row = self._rows[message_id]
+            if row["level"] < 100:
+                return self._stored(row, slot)
+        return None
+
+    async def update(self, pokemon: List[Write], *, pokedex: Iterable[Tuple[int, int]] = ()):
+        for write in pokemon:
+            row = pokemon_row(*write)
+            old = self._rows.get(row["message_id"])
+            if old is None or old["user_id"] != row["user_id"]:
+                continue
+            row["version"] = old["version"] + 1
+            self._rows[row["message_id"]] = row
+        for user_id, species_id in pokedex:
+            self._count(user_id, species_id)
+
+    def _remove(self, message_id: int) -> Optional[dict]:
+        row = self._rows.pop(message_id, None)
+        if row is not None:
+            self._slots[row["user_id"]].remove(message_id)
+        return row
+
+    async def delete(self, message_id: int) -> bool:
+        return self._remove(message_id) is not None
+
+    async def transfer(self, message_id: int, user_id: int, new_message_id: int) -> bool:
+        row = self._remove(message_id)
+        if row is None:
+            return False
+        self._add(pokemon_row(user_id, new_message_id, json.loads(row["pokemon"])))
+        return True
+
+    async def count(self, user_id: int) -> int:
+        return len(self._slots.get(user_id, []))
+
+    async def pokedex(self, user_id: int) -> Dict[int, int]:
+        return dict(self._pokedex.get(user_id, {}))
+
+    def _matches(self, row: dict, filters: Dict[str, Any], ranges: Dict[str, List[Bound]]):
+        if "names" in filters and row["species_id"] not in filters["names"]:
+            return False
+        if "variant" in filters:
+            variant = row["variant"] if row["variant"] is not None else "None"
+            if variant.lower() != filters["variant"]:
+                return False
+        if "gender" in filters and (row["gender"] or "no") != filters["gender"]:
+            return False
+        if "type" in filters:
+            types = json.loads(row["pokemon"]).get("type", [])
+            if filters["type"] not in (_type.lower() for _type in types):
+                return False
+        for key, bounds in ranges.items():
+            value = row[SEARCH_RANGES[key]]
+            if value is None or not all(_OPERATORS[op](value, bound) for op, bound in bounds):
+                return False
+        return True
+
+    async def search(self, user_id, filters, ranges, *, sort="slot", descending=False, limit=None):
+        rows = [
+            (slot, self._rows[message_id])
+            for slot, message_id in enumerate(self._slots.get(user_id, []), start=1)
+        ]
+        rows = [(slot, row) for slot, row in rows if self._matches(row, filters, ranges)]
+        if sort != "slot" or descending:
+            column = SEARCH_SORTS[sort]
+            key = (lambda x: x[0]) if sort == "slot" else (lambda x: x[1][column] or 0)
+            rows.sort(key=key, reverse=descending)
+        for slot, row in rows[:limit]:
+            yield json.loads(row["pokemon"])["name"], row["level"], row["species_id"], slot
+
+
+def open_storage(
+    backend: str,
+    *,
+    database: Database,
+    url: str,
+    path: str,
+    executor: concurrent.futures.Executor,
+) -> Storage:
+    if backend == "apsw":
+        return APSWStorage(path, executor)
+    if backend == "memory":
+        return MemoryStorage()
+    return DatabasesStorage(database, url)
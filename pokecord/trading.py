@@ -1,5 +1,4 @@
 import asyncio
-import json
 
 import discord
 import tabulate
@@ -10,7 +9,6 @@ from redbot.core.utils.chat_formatting import *
 from redbot.core.utils.predicates import MessagePredicate
 
 from .abc import MixinMeta
-from .statements import *
 
 poke = MixinMeta.poke
 
@@ -26,20 +24,12 @@ class TradeMixin(MixinMeta):
 
         Currently a work in progress."""
         async with ctx.typing():
-            result = await self.cursor.fetch_all(
-                query="""SELECT pokemon, message_id from users where user_id = :user_id""",
-                values={"user_id": ctx.author.id},
-            )
-            pokemons = [None]
-            for data in result:
-                pokemons.append([json.loads(data[0]), data[1]])
+            await self.xpledger.evict(ctx.author.id)
+            data = await self.fetch_slot(ctx.author.id, id)
 
-        if not pokemons:
-            return await ctx.send(_("You don't have any pokémon, trainer!"))
-        if id >= len(pokemons):
+        if data is None:
             return await ctx.send(_("You don't have a pokemon at that slot."))
-        pokemon = pokemons[id]
-        name = self.get_name(pokemon[0]["name"], ctx.author)
+        name = self.get_name(data.pokemon["name"], ctx.author)
 
         await ctx.send(
             _(
@@ -94,31 +84,14 @@ class TradeMixin(MixinMeta):
                 return
 
             if authorconfirm.result:
-                await self.cursor.execute(
-                    query="DELETE FROM users where message_id = :message_id",
-                    values={"message_id": pokemon[1]},
-                )
-                await self.cursor.execute(
-                    query=INSERT_POKEMON,
-                    values={
-                        "user_id": user.id,
-                        "message_id": ctx.message.id,
-                        "pokemon": json.dumps(pokemon[0]),
-                    },
-                )
-                userconf = await self.user_is_global(ctx.author)
-                pokeid = await userconf.pokeid()
+                await self.xpledger.evict(ctx.author.id)
                 msg = ""
-                if id < pokeid:
-                    msg += _(
-                        "{user}, your default pokemon may have changed. I have tried to account for this change."
-                    ).format(user=ctx.author)
-                    await userconf.pokeid.set(pokeid - 1)
-                elif id == pokeid:
+                if await self.deselect_pokemon(ctx.author, data.message_id):
                     msg += _(
                         "{user}, You have traded your selected pokemon. I have reset your selected pokemon to your first pokemon."
                     ).format(user=user)
-                    await userconf.pokeid.set(1)
+                if not await self.transfer_pokemon(data.message_id, user.id, ctx.message.id):
+                    return await ctx.send(_("You don't have a pokemon at that slot."))
 
                 await bank.withdraw_credits(user, bal)
                 try:
@@ -1,7 +1,11 @@
 import asyncio
+import importlib.util
 
 # driver = webdriver.Chrome(executable_path=r"chromedriver.exe")
 import json
+import os
+import sys
+import time
 from io import BytesIO
 
 # import aiohttp
@@ -15,6 +19,7 @@ CDNURL = "https://assets.pokemon.com/assets/cms2/img/pokedex/detail/{}.png"
 POKEDEX = "https://img.pokemondb.net/artwork/{}"
 EVOLVE = "https://pokemondb.net/evolution/level"
 SHINY = "https://pokemondb.net/pokedex/shiny"
+DATA = "pokecord/data"
 
 
 # DOESNT DO MEGAS ETC.
@@ -175,5 +180,124 @@ def spawn_rate():
         f.write(json.dumps(data))
 
 
-loop = asyncio.get_event_loop()
-loop.run_until_complete(main())
+def _optimise_sprite(image, max_pixels: int, max_bytes: int) -> bytes:
+    from PIL import Image
+
+    image = image.convert("RGBA")
+    image.thumbnail((max_pixels, max_pixels), Image.LANCZOS)
+    data = b""
+    while True:
+        for colours in (256, 128, 64, 32):
+            buffer = BytesIO()
+            image.quantize(colours, method=Image.FASTOCTREE).save(
+                buffer, format="PNG", optimize=True
+            )
+            data = buffer.getvalue()
+            if len(data) <= max_bytes:
+                return data
+        if max(image.size) <= 64:
+            return data  # Smallest we're willing to go, over budget or not.
+        image = image.resize((int(image.width * 0.8), int(image.height * 0.8)), Image.LANCZOS)
+
+
+def optimise_sprites(max_pixels=256, max_kb=32):
+    """Downsize and palette-quantise every sprite into pokemon_optimised."""
+    from PIL import Image
+
+    source = f"{DATA}/pokemon"
+    target = f"{DATA}/pokemon_optimised"
+    os.makedirs(target, exist_ok=True)
+    manifest = {"max_pixels": max_pixels, "max_bytes": max_kb * 1024, "sprites": {}}
+    before = after = 0
+    for filename in sorted(os.listdir(source)):
+        if not filename.endswith(".png"):
+            continue
+        with open(f"{source}/{filename}", "rb") as f:
+            original = f.read()
+        with Image.open(BytesIO(original)) as image:
+            data = _optimise_sprite(image, max_pixels, max_kb * 1024)
+        if len(data) >= len(original):
+            data = original
+        with open(f"{target}/{filename}", "wb") as f:
+            f.write(data)
+        manifest["sprites"][filename[:-4]] = {"original": len(original), "optimised": len(data)}
+        before += len(original)
+        after += len(data)
+    manifest["original"] = before
+    manifest["optimised"] = after
+    with open(f"{target}/manifest.json", "w") as f:
+        f.write(json.dumps(manifest, indent=1))
+    print(
+        f"{len(manifest['sprites'])} sprites: {before / 1024 / 1024:.1f}MB -> "
+        f"{after / 1024 / 1024:.1f}MB ({1 - after / before:.0%} smaller)"
+    )
+
+
+def _module(name):
+    # Loaded by path so the cog package and its Red dependencies aren't imported.
+    spec = importlib.util.spec_from_file_location(name, f"pokecord/{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _catalog():
+    return _module("catalog")
+
+
+def build_sprite_pack(spriteset="original"):
+    """Pack a sprite set into one file the cog memory-maps, keyed by species key."""
+    spritepack = _module("spritepack")
+    catalog = _catalog()
+    folder = spritepack.SPRITE_SETS[spriteset]
+    sprites = []
+    for pokemon in catalog.build(DATA)["pokemon"]:
+        key = catalog.species_key(pokemon)
+        filename = f"{key.replace(':', '')}.png"
+        path = f"{DATA}/{folder}/{filename}"
+        if not os.path.isfile(path):
+            path = f"{DATA}/pokemon/{filename}"
+        sprites.append((key, path))
+    index = spritepack.build_pack(sprites, f"{DATA}/{folder}.pack")
+    missing = len(sprites) - len(index)
+    size = os.path.getsize(f"{DATA}/{folder}.pack")
+    print(f"Packed {len(index)} sprites into {folder}.pack ({size / 1024 / 1024:.1f}MB).")
+    if missing:
+        print(f"{missing} pokemon have no sprite.")
+
+
+def build_catalog():
+    catalog = _catalog()
+    data = catalog.build(DATA)
+    catalog.write(data, DATA)
+    print(f"Built catalog {data['version']} with {len(data['pokemon'])} pokemon.")
+
+
+def bench_catalog(runs=10):
+    catalog = _catalog()
+    timings = {}
+    for name, func in (
+        ("json", lambda: catalog.build(DATA)),
+        ("compiled", lambda: catalog.load(DATA)),
+    ):
+        start = time.perf_counter()
+        for _ in range(runs):
+            func()
+        timings[name] = (time.perf_counter() - start) / runs * 1000
+        print(f"{name}: {timings[name]:.1f}ms")
+    print(f"{timings['json'] / timings['compiled']:.1f}x faster")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "catalog":
+        build_catalog()
+    elif command == "bench":
+        bench_catalog()
+    elif command == "pack":
+        build_sprite_pack(*sys.argv[2:3])
+    elif command == "sprites":
+        optimise_sprites(*map(int, sys.argv[2:4]))
+    else:
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(main())